@@ -20,6 +20,8 @@ import pandas as pd
 import cdat
 import pickle
 
+import parsecache
+
 def Cdat2Pandas(cd):
     """Convert given cdat object to pandas dataframe
     """
@@ -31,8 +33,14 @@ def Cdat2Pandas(cd):
         df[key] = cd.values(key)
     return df
 
-def ReadCdat2Pandas(filename):
+def ReadCdat2Pandas(filename, cache=True):
     """Return pandas dataframe containing data from saved cdat file
+    cache --> read through binary parse cache (see `parsecache`), False to always parse text
+    """
+    return parsecache.CachedRead(filename, _ReadCdat2Pandas, cache=cache)
+
+def _ReadCdat2Pandas(filename):
+    """Parse saved cdat file for `ReadCdat2Pandas` (uncached)
     """
     #READ CDAT FILE
     cd = cdat.ColDat()
@@ -0,0 +1,181 @@
+"""FORCE HISTORY PROCESSING
+Logan Halstrom
+CREATED:  18 OCT 2026
+MODIFIED: 18 OCT 2026
+
+DESCRIPTION:  Chunked, out-of-core reduction of CFD force/moment histories
+to aerodynamic coefficients with `aero` coordinate transforms.
+Files are read in fixed-size chunks (numpy `.npy` files are memory-mapped),
+each chunk is transformed and nondimensionalized, and results are written
+incrementally, so memory stays bounded regardless of history length.
+
+HOW TO USE:
+    import forcehistory as fh
+    pipe = fh.ForceHistoryPipeline(alpha='alpha', beta=0, qinf=1200, Sref=2.5, AR=8)
+    pipe.Process('run1.dat', 'run1_coeffs.dat')
+    pipe.ProcessFiles(['run1.dat', 'run2.dat'], nproc=4)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import aero
+
+def ReadChunks(path, chunksize=100000, sep=r'\s+', comment='#'):
+    """Iterate over a force history file in DataFrame chunks.
+    `.npy` files (structured arrays with named fields) are memory-mapped,
+    everything else is read as delimited text with a header row.
+    path      --> path to force history file
+    chunksize --> number of rows per chunk
+    sep       --> text column delimiter (default whitespace)
+    comment   --> text comment character
+    """
+    if path.endswith('.npy'):
+        arr = np.load(path, mmap_mode='r')
+        if arr.dtype.names is None:
+            raise ValueError('"{}" must be a structured array with named fields'.format(path))
+        for i in range(0, len(arr), chunksize):
+            #copy only current chunk out of memory map
+            yield pd.DataFrame(np.array(arr[i:i+chunksize]))
+    else:
+        for chunk in pd.read_csv(path, sep=sep, comment=comment, chunksize=chunksize):
+            yield chunk
+
+class ForceHistoryPipeline():
+    """ Settings and per-chunk processing for reducing force histories
+    (Global2Body --> Body2Lift --> CDi).
+    Angles and reference values may be constants or names of columns in the
+    force history.
+    """
+
+    def __init__(self,
+                cols=('CX', 'CY', 'CZ'),
+                theta=None, psi=None,
+                alpha=None, beta=None,
+                qinf=None, Sref=None,
+                AR=None, e=1,
+                unit='deg',
+                chunksize=100000,
+                sep=r'\s+',
+                ):
+        """ Constructor for force history pipeline
+
+        Args:
+            cols (:obj:`tuple`): Input x,y,z force (or coefficient) column names [('CX','CY','CZ')]
+            theta, psi (:obj:`float` or :obj:`str`): Pitch/yaw for global to body rotation.  None skips rotation [None]
+            alpha, beta (:obj:`float` or :obj:`str`): Angles for body to lift/drag rotation.  None skips rotation [None]
+            qinf (:obj:`float` or :obj:`str`): Dynamic pressure for nondimensionalization of forces.  None if inputs are coefficients [None]
+            Sref (:obj:`float`): Reference area for nondimensionalization, required with `qinf` [None]
+            AR (:obj:`float`): Wing aspect ratio for induced drag.  None skips CDi [None]
+            e (:obj:`float`): Oswald efficiency for induced drag [1]
+            unit (:obj:`str`): Angle units, 'deg' or 'rad' ['deg']
+            chunksize (:obj:`int`): Number of rows per chunk [100000]
+            sep (:obj:`str`): Text column delimiter for input and output [whitespace]
+        """
+        if qinf is not None and Sref is None:
+            raise ValueError('ForceHistoryPipeline requires Sref to nondimensionalize by qinf')
+        self.cols = cols
+        self.theta, self.psi = theta, psi
+        self.alpha, self.beta = alpha, beta
+        self.qinf, self.Sref = qinf, Sref
+        self.AR, self.e = AR, e
+        self.unit = unit
+        self.chunksize = chunksize
+        self.sep = sep
+
+    def __repr__(self):
+        """ Return the representation of this object.
+        """
+        return "force history pipeline"
+
+    def _Get(self, chunk, val, default=0):
+        """ Get value that is either a constant or a column of current chunk
+        """
+        if val is None:
+            return default
+        if isinstance(val, str):
+            return chunk[val].to_numpy()
+        return val
+
+    def ProcessChunk(self, chunk):
+        """ Transform and nondimensionalize one chunk of force history.
+        Adds global axis (CX, CY, CZ, if nondimensionalized by `qinf`), body
+        axis (CA, CYb, CN), wind axis (CL, CD, CS), and induced drag (CDi)
+        columns, as configured.  Input columns with the same names as added
+        columns are replaced.
+        Args:
+            chunk (:obj:`~pandas.DataFrame`): chunk of force history
+        Returns:
+            (:obj:`~pandas.DataFrame`): chunk with added coefficient columns
+        """
+        x, y, z = [chunk[c].to_numpy(dtype=float) for c in self.cols]
+
+        #NONDIMENSIONALIZE FORCES
+        if self.qinf is not None:
+            qS = self._Get(chunk, self.qinf) * self.Sref
+            x, y, z = x / qS, y / qS, z / qS
+            chunk['CX'], chunk['CY'], chunk['CZ'] = x, y, z
+
+        #GLOBAL TO BODY AXES
+        if self.theta is not None or self.psi is not None:
+            x, y, z = aero.Global2Body(x, y, z,
+                            self._Get(chunk, self.theta), self._Get(chunk, self.psi),
+                            self.unit)
+            chunk['CA'], chunk['CYb'], chunk['CN'] = x, y, z
+
+        #BODY TO LIFT/DRAG AXES
+        if self.alpha is not None or self.beta is not None:
+            CL, CD, CS = aero.Body2Lift(x, y, z,
+                            self._Get(chunk, self.alpha), self._Get(chunk, self.beta),
+                            self.unit)
+            chunk['CL'], chunk['CD'], chunk['CS'] = CL, CD, CS
+
+            #INDUCED DRAG
+            if self.AR is not None:
+                chunk['CDi'] = aero.CDi(CL, self.AR, self.e)
+
+        return chunk
+
+    def Process(self, infile, outfile=None):
+        """ Stream one force history file through the pipeline, writing each
+        processed chunk to the output text file as it goes.
+        Args:
+            infile  (:obj:`str`): path to force history (text or `.npy`)
+            outfile (:obj:`str`): path to output text file ['<infile>_coeffs.dat']
+        Returns:
+            (:obj:`int`): number of rows processed
+        """
+        if outfile is None:
+            outfile = '{}_coeffs.dat'.format(os.path.splitext(infile)[0])
+        outsep = ' ' if self.sep == r'\s+' else self.sep
+
+        nrow = 0
+        #write to temporary file so partial output never looks complete
+        tmpfile = '{}.part'.format(outfile)
+        with open(tmpfile, 'w') as ofile:
+            for chunk in ReadChunks(infile, self.chunksize, self.sep):
+                chunk = self.ProcessChunk(chunk)
+                chunk.to_csv(ofile, sep=outsep, index=False, header=(nrow == 0))
+                nrow += len(chunk)
+        os.replace(tmpfile, outfile)
+        return nrow
+
+    def ProcessFiles(self, infiles, outfiles=None, nproc=1):
+        """ Process many force history files, optionally in a process pool
+        (one file per worker, each with bounded memory).
+        Args:
+            infiles  (:obj:`list`): paths to force histories
+            outfiles (:obj:`list`): paths to outputs [default of `Process`]
+            nproc    (:obj:`int`): number of worker processes (1 runs serially) [1]
+        Returns:
+            (:obj:`list`): number of rows processed in each file
+        """
+        if outfiles is None:
+            outfiles = [None] * len(infiles)
+        if nproc is None or nproc > 1:
+            with ProcessPoolExecutor(max_workers=nproc) as pool:
+                return list(pool.map(self.Process, infiles, outfiles))
+        return [self.Process(i, o) for i, o in zip(infiles, outfiles)]
@@ -10,11 +10,17 @@ import subprocess
 import os
 import errno
 import re
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy.interpolate import interp1d
 import pandas as pd
 
+import parsecache
+
 def cmd(command):
     """Execute a shell command.
     TIPS:
@@ -163,41 +169,283 @@ def listify(nonlist, n=1):
 ### PANDAS UTILITIES ###################################################
 ########################################################################
 
-def dfInterp(df, key, vals, method='linear', fill=np.nan):
+class InterpWeights():
+    """ Precomputed search indices/weights for interpolating data sampled at
+    `x` onto `xnew`, applied to whole 2-D blocks of columns at once.
+    Reproduces `scipy.interpolate.interp1d` exactly (default bounds_error,
+    float64 data) for 'linear', 'nearest' and 'previous'.
+    Compute once and reuse for every dataset that shares the same `x`.
+    """
+
+    methods = ('linear', 'nearest', 'previous')
+
+    def __init__(self, x, xnew, method='linear'):
+        """ Search interpolation intervals of new values
+        x      --> independent variable of data (sorted internally, like interp1d)
+        xnew   --> values to interpolate to
+        method --> interpolation method ('linear', 'nearest', 'previous')
+        """
+        if method not in self.methods:
+            raise ValueError('InterpWeights method must be one of {}, not "{}"'.format(
+                                                                self.methods, method))
+        x = np.asarray(x)
+        xnew = np.asarray(xnew)
+        if x.ndim != 1 or len(x) < 2:
+            raise ValueError('InterpWeights requires at least two 1-D data points')
+
+        self.method = method
+        self.n = len(x)
+        self.nnew = len(xnew)
+
+        #SORT DATA (stable, like interp1d)
+        self.order = None
+        if np.any(x[1:] < x[:-1]):
+            self.order = np.argsort(x, kind='mergesort')
+            x = x[self.order]
+
+        #CHECK BOUNDS (interp1d default raises out of range)
+        below = xnew < x[0]
+        if below.any():
+            raise ValueError("A value ({}) in x_new is below the interpolation "
+                "range's minimum value ({}).".format(xnew[np.argmax(below)], x[0]))
+        above = xnew > x[-1]
+        if above.any():
+            raise ValueError("A value ({}) in x_new is above the interpolation "
+                "range's maximum value ({}).".format(xnew[np.argmax(above)], x[-1]))
+
+        if method == 'linear':
+            #interval of each new value: x[j] <= xnew < x[j+1] (as `np.interp`)
+            j = np.searchsorted(x, xnew, side='right') - 1
+            #new values at data points take their values exactly
+            self.exact = np.flatnonzero(xnew == x[j])
+            self.jexact = j[self.exact]
+            self.j = j.clip(0, self.n - 2)
+            self.dx = (x[self.j+1] - x[self.j])[:,None]
+            self.t = (xnew - x[self.j])[:,None]
+            #no retry for new NaN values or data points
+            self.skip = np.isnan(xnew)
+            self.skip[self.exact] = True
+            self.x = x
+            self.xnew = xnew
+        elif method == 'nearest':
+            #halfway points between data, ties go to left neighbor
+            bds = x / 2.0
+            bds = bds[1:] + bds[:-1]
+            self.j = np.searchsorted(bds, xnew, side='left').clip(0, self.n - 1)
+        else:
+            #previous data point (inclusive)
+            shift = np.nextafter(x, -np.inf)
+            self.j = np.searchsorted(shift, xnew, side='left').clip(1, self.n) - 1
+
+    def Apply(self, values):
+        """ Interpolate data block
+        values --> array of data at `x` (1-D or 2-D with rows along `x`)
+        """
+        y = np.asarray(values)
+        if len(y) != self.n:
+            raise ValueError('Data has {} rows, InterpWeights expects {}'.format(len(y), self.n))
+        if not np.issubdtype(y.dtype, np.inexact):
+            y = y.astype(np.float64)
+        if self.order is not None:
+            y = y[self.order]
+        vector = y.ndim == 1
+        if vector:
+            y = y[:,None]
+
+        if self.method != 'linear':
+            ynew = y[self.j]
+        else:
+            #gather neighbors and blend in one pass (same arithmetic as `np.interp`)
+            ylo = y[self.j]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                slope = y[self.j+1]
+                slope -= ylo
+                slope /= self.dx
+                ynew = slope * self.t
+                ynew += ylo
+            ynew[self.exact] = y[self.jexact]
+            #infinite data: retry from right neighbor, then flat intervals
+            bad = np.isnan(ynew)
+            bad[self.skip] = False
+            if bad.any():
+                r, c = np.nonzero(bad)
+                j = self.j[r]
+                yhi = y[j+1, c]
+                with np.errstate(invalid='ignore'):
+                    retry = slope[r,c] * (self.xnew[r] - self.x[j+1]) + yhi
+                flat = np.isnan(retry) & (y[j, c] == yhi)
+                retry[flat] = yhi[flat]
+                ynew[r,c] = retry
+
+        return ynew[:,0] if vector else ynew
+
+def dfInterp(df, key, vals, method='linear', fill=np.nan, weights=None):
     """Interpolate a Pandas DataFrame so that the selected column
     matches the provided list.
+    float64/integer/bool (numpy dtype) columns are interpolated together with
+    precomputed `InterpWeights` ('linear', 'nearest', 'previous'), others
+    (and other methods/extrapolation) use scipy.interpolate.interp1d per column.
     NOTE: Recommended use time as 'key' for timeseries data for correct interp
     df     --> Pandas DataFrame to interpolate
     key    --> column key for independent variable to interpolate against
     vals   --> values to interpolate to
-    method --> interpolation method ('linear', 'nearest', 'cubic')
+    method --> interpolation method ('linear', 'nearest', 'previous', 'cubic')
                 (see scipy.interpolate.interp1d for more options)
+    weights --> `InterpWeights` from df[key] to vals, to reuse across frames
+                sharing the same key [None, compute here]
     """
+    #columns interpolated in one block by weights
+    block = []
+    if (weights is not None or method in InterpWeights.methods) \
+            and not (isinstance(fill, str) and fill == 'extrapolate') and len(df) > 1:
+        #(numpy dtypes only, extension dtypes like Float64/Int64/category use interp1d)
+        if isinstance(df[key].dtype, np.dtype):
+            block = [k for k in df.keys() if isinstance(df[k].dtype, np.dtype)
+                        and (df[k].dtype == np.float64 or df[k].dtype.kind in 'iub')]
+    if block and weights is None:
+        weights = InterpWeights(df[key].to_numpy(), vals, method)
+
     newdf = pd.DataFrame() #Interpolated DataFrame
+    if block:
+        ynew = weights.Apply(df[block].to_numpy(dtype=np.float64))
+        newdf = pd.DataFrame(ynew, columns=block)
     for k in df.keys():
+        if k in block:
+            continue
         #interp func for each column
         f = interp1d(df[key], df[k], kind=method, fill_value=fill)
         newdf[k] = f(vals) #Interp each column to desired values
-    return newdf
+    return newdf[list(df.keys())] if len(df.keys()) else newdf
+
+class ResamplePlan():
+    """ Reusable plan for resampling many time series onto one target time
+    vector. Interpolation weights from each source time vector to the target
+    are compiled once and cached by a hash of the source time vector (shared
+    by all plans), then applied to any number of DataFrames or arrays.
+
+    HOW TO USE:
+        plan = ResamplePlan(tnew, key='time')
+        cfd, sensor, traj = plan.ApplyMany([cfd, sensor, traj], nthreads=4)
+    """
 
-def dfTimeSubset(df, tstart=None, tend=None, tevery=1, reindex=True):
+    #cache of compiled weights: (source hash, target hash, method) --> InterpWeights
+    _cache = OrderedDict()
+    _cachesize = 64
+    _lock = threading.Lock()
+
+    def __init__(self, target, key='time', method='linear'):
+        """ Set target time vector
+        target --> time values to resample to
+        key    --> DataFrame column of source time vector ['time']
+        method --> interpolation method ('linear', 'nearest', 'previous')
+        """
+        self.target = np.asarray(target)
+        self.key = key
+        self.method = method
+        self._targethash = self.Hash(self.target)
+
+    @staticmethod
+    def Hash(t):
+        """ Hash of a time vector (values, dtype and length)
+        """
+        t = np.ascontiguousarray(t)
+        return hashlib.sha1(t.view(np.uint8)).hexdigest() + str(t.dtype) + str(len(t))
+
+    def Weights(self, source):
+        """ Get (cached) interpolation weights from source time vector to target
+        source --> source time vector
+        """
+        source = np.asarray(source)
+        cachekey = (self.Hash(source), self._targethash, self.method)
+        with self._lock:
+            weights = self._cache.get(cachekey)
+            if weights is not None:
+                self._cache.move_to_end(cachekey)
+                return weights
+        weights = InterpWeights(source, self.target, self.method)
+        with self._lock:
+            self._cache[cachekey] = weights
+            while len(self._cache) > self._cachesize:
+                self._cache.popitem(last=False)
+        return weights
+
+    def Apply(self, data, source=None):
+        """ Resample one dataset onto target time vector
+        data   --> DataFrame (with `key` column), or array with rows along time
+        source --> source time vector [data[key] for DataFrames]
+        """
+        if isinstance(data, pd.DataFrame):
+            weights = None
+            if source is not None or isinstance(data[self.key].dtype, np.dtype):
+                if source is None:
+                    source = data[self.key].to_numpy()
+                weights = self.Weights(source)
+            return dfInterp(data, self.key, self.target, method=self.method,
+                            weights=weights)
+        if source is None:
+            raise ValueError('Source time vector required to resample arrays')
+        return self.Weights(source).Apply(data)
+
+    def ApplyMany(self, datas, sources=None, nthreads=None):
+        """ Resample many datasets, in a thread pool across datasets
+        datas    --> list of DataFrames or arrays
+        sources  --> list of source time vectors [None for each, see `Apply`]
+        nthreads --> number of threads [None, `ThreadPoolExecutor` default]
+        """
+        if sources is None:
+            sources = [None] * len(datas)
+        with ThreadPoolExecutor(max_workers=nthreads) as pool:
+            return list(pool.map(self.Apply, datas, sources))
+
+    @classmethod
+    def ClearCache(cls):
+        """ Remove all cached weights
+        """
+        with cls._lock:
+            cls._cache.clear()
+
+def IsTimeSorted(df, key='time'):
+    """Check if time column of dataframe is sorted (ascending, no NaN).
+    One pass over the column, no copies
+    df  --> dataframe with time column
+    key --> time column key
+    """
+    t = df[key].to_numpy()
+    #(comparisons with NaN are False, so NaN anywhere is unsorted)
+    return bool(np.all(t[1:] >= t[:-1])) and bool(len(t) == 0 or t[0] == t[0])
+
+def dfTimeSubset(df, tstart=None, tend=None, tevery=1, reindex=True, issorted=None):
     """Get time interval subset of provided dataframe
+    For sorted time, both bounds are found by binary search and the subset is
+    a single strided slice (no boolean masks/copies of the full dataframe)
 
     df     --> dataframe with trajectory data
     tstart --> subset start time
     tend   --> subset end time
     everyt --> time step size (sample rate of 40Hz)
     reindex --> reset dataframe index after resizing timeseries
+    issorted --> True if time is sorted, False to filter with boolean masks,
+                    None to check every call (see `IsTimeSorted`)
     """
-    #Trim time series to specified interval
-    if tstart != None:
-        df = df[df.time >= tstart]
-    if tend != None:
-        df = df[df.time <= tend]
-    #Reduce points by interval
-    if tevery > 1:
-        #keep every 'everyt'-th row
-        df = df.loc[::tevery,:]
+    if issorted is None:
+        issorted = IsTimeSorted(df)
+
+    if issorted:
+        #Trim time series to specified interval, keeping every 'everyt'-th row
+        t = df['time'].to_numpy()
+        i0 = np.searchsorted(t, tstart, side='left') if tstart != None else 0
+        i1 = np.searchsorted(t, tend, side='right') if tend != None else len(t)
+        df = df.iloc[i0:max(i0, i1):(tevery if tevery > 1 else 1)]
+    else:
+        #Trim time series to specified interval
+        if tstart != None:
+            df = df[df.time >= tstart]
+        if tend != None:
+            df = df[df.time <= tend]
+        #Reduce points by interval
+        if tevery > 1:
+            #keep every 'everyt'-th row
+            df = df.loc[::tevery,:]
     #reset df index
     if reindex:
         df = df.reset_index(drop=True)
@@ -205,14 +453,20 @@ def dfTimeSubset(df, tstart=None, tend=None, tevery=1, reindex=True):
     return df
 
 def dfWriteFixedWidth(df, savename, index=True, datatype='f', wid=16, prec=6,
-                        writemode='w'):
+                        writemode='w', chunksize=100000):
     """Write dataframe to file with fixed-width format
     Requires string column headers, integer indices
+    Rows are formatted a chunk at a time with a single string format call
+    over the flattened chunk values and written as one large buffer.
+    df       --> DataFrame, or iterable of DataFrame chunks (e.g. from
+                    `pd.read_csv(..., chunksize=N)`) to stream frames larger
+                    than memory (header is taken from the first chunk)
     index    --> write index to file
     datatype --> 'f' for float data, 's' for string data
     wid      --> column width in spaces
     prec     --> decimal precision (number of decimal places for floats)
     writemode --> option to append to existing file
+    chunksize --> number of rows formatted/written at a time
 
     ':<16.6f' = FORMAT STATEMENT FOR 16-WIDE COLUMNS
     <  : left-aligned,
@@ -221,60 +475,48 @@ def dfWriteFixedWidth(df, savename, index=True, datatype='f', wid=16, prec=6,
     f  : float
     """
 
-    #STOP PANDAS FROM COMPLAINING ABOUT CHANGING THE ORIGINAL DF
-    df = df.copy()
-
     #SET STRING FORMATTING TYPE
-    def format_float(wid, val, prec):
-        #float formatting
-        return '{2:<{0}.{1}f}'.format(wid, prec, val)
-
-    def format_other(wid, val, prec=None):
-        #every other type formatting
-        return '{1:<{0}}'.format(wid, val)
-    #pointer for string formatting function
     if datatype == 'f':
-        formatfunc = format_float
+        #float formatting
+        valfmt = '{{:<{0}.{1}f}}'.format(wid, prec)
     else:
-        formatfunc = format_other
+        #every other type formatting
+        valfmt = '{{:<{0}}}'.format(wid)
+    idxfmt = '{{:<{0}}}'.format(wid)
 
-
-    #GET COLUMN HEADERS
-    cols = list(df.columns.values)
+    #single frame is one chunk of the stream
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
 
     #OPEN FILE
-    if writemode == 'a':
-        #APPEND TO EXISTING FILE
-        ofile = open(savename, 'a')
-    else:
-        #WRITE TO NEW FILE
-        ofile = open(savename, 'w')
-
-        #WRITE HEADER ROW
-        #first column is empty (full column spaces) if index, otherwise nothing
-        line = '{1:<{0}}'.format(wid, ' ') if index else ''
-        #concatenate column headers in fixed-width format
-        for c in cols:
-            #0 indicates 1st format entry goes in this {} (number of column spaces)
-            #1: indicates 2nd format entry goes in this {} (column name)
-            line += '{1:<{0}}'.format(wid, c)
-            # line += '{:<16}'.format(c)
-        #write header to file
-        ofile.write('{}\n'.format(line))
-
-    #WRITE EACH ROW (slightly faster version)
-    #start text of each row
-    if index:
-        # df['line'] = ['{1:<{0}}'.format(wid, str(i)) for i in df.index.values]
-        df['line'] = df.apply(lambda row: '{1:<{0}}'.format(wid, str(row.name)), axis = 1)
-    else:
-        df['line'] = ''
-    #rest of text for each row
-    df['line'] = df.apply(lambda row: row.line + ''.join([formatfunc(wid, row[c], prec) for c in cols]), axis = 1)
-
-    for line in df.line:
-        #write current data line to file
-        ofile.write('{}\n'.format(line))
+    with open(savename, 'a' if writemode == 'a' else 'w') as ofile:
+        for n, chunk in enumerate(chunks):
+            #GET COLUMN HEADERS
+            cols = list(chunk.columns.values)
+
+            if n == 0 and writemode != 'a':
+                #WRITE HEADER ROW
+                #first column is empty (full column spaces) if index, otherwise nothing
+                line = '{1:<{0}}'.format(wid, ' ') if index else ''
+                #concatenate column headers in fixed-width format
+                for c in cols:
+                    line += '{1:<{0}}'.format(wid, c)
+                #write header to file
+                ofile.write('{}\n'.format(line))
+
+            #format of each line: (index) and values of each column
+            rowfmt = (idxfmt if index else '') + valfmt * len(cols) + '\n'
+
+            #WRITE ROWS, CHUNK AT A TIME
+            for i0 in range(0, len(chunk), chunksize):
+                sub = chunk.iloc[i0:i0+chunksize]
+                #boxed values keep type of each column
+                vals = sub.to_numpy(dtype=object)
+                if index:
+                    block = np.empty((vals.shape[0], vals.shape[1] + 1), dtype=object)
+                    block[:,0] = [str(i) for i in sub.index]
+                    block[:,1:] = vals
+                    vals = block
+                ofile.write((rowfmt * vals.shape[0]).format(*vals.ravel().tolist()))
 
 
     # #WRITE EACH ROW
@@ -301,35 +543,124 @@ def dfWriteFixedWidth(df, savename, index=True, datatype='f', wid=16, prec=6,
     #     #write current data line to file
     #     ofile.write('{}\n'.format(line))
 
-    #CLOSE FILE
-    ofile.close()
+def dfReadFixedWidth(path, index=True, header=True, wid=16, usecols=None,
+                        dtype=float, chunksize=None):
+    """Read fixed-width file written by `dfWriteFixedWidth` into a DataFrame.
+    The file is memory-mapped and each column is sliced from the byte buffer
+    at its fixed offset (strided 'S{wid}' view) and converted in bulk.
+    Requires every field to fit its width (all lines the same length)
+    index     --> first column is the index
+    header    --> first line is the header row of column names
+    wid       --> column width in spaces
+    usecols   --> list of column names to read. None for all
+    dtype     --> type to convert columns to (columns that do not convert
+                    are returned as stripped strings)
+    chunksize --> return iterator over DataFrames of this many rows instead,
+                    for files bigger than memory
+    """
+    buf = np.memmap(path, dtype=np.uint8, mode='r')
+
+    #HEADER ROW
+    start = 0
+    if header:
+        newline = np.flatnonzero(buf[:1<<20] == ord('\n'))
+        if len(newline) == 0:
+            #header only, or longer than 1MB
+            with open(path) as f:
+                start = len(f.readline().encode())
+        else:
+            start = newline[0] + 1
+        names = bytes(buf[:start]).decode().split()
+    #LINE LAYOUT
+    if len(buf) > start:
+        linelen = np.flatnonzero(buf[start:start+(1<<20)] == ord('\n'))[0] + 1
+    else:
+        linelen = wid * (len(names) + index) + 1 if header else 1
+    ncol = (linelen - 1) // wid
+    if not header:
+        names = list(range(ncol - index))
+    if linelen != wid * ncol + 1 or ncol != len(names) + index \
+            or (len(buf) - start) % linelen:
+        raise ValueError('"{}" is not a fixed-width file of {}-wide columns'.format(path, wid))
+    nrow = (len(buf) - start) // linelen
+
+    #strided view of every field: (rows, columns) of wid-byte strings
+    fields = np.ndarray((nrow, ncol), dtype='S{}'.format(wid), buffer=buf,
+                        offset=start, strides=(linelen, wid))
+    cols = [(i + index, c) for i, c in enumerate(names)
+                if usecols is None or c in usecols]
+
+    def convert(raw, typ):
+        #bulk conversion of column, stripped strings if not convertible
+        try:
+            return raw.astype(typ)
+        except ValueError:
+            return np.char.strip(raw).astype(str).astype(object)
+
+    def readrows(i0, i1):
+        #check line ends of this block
+        if np.any(buf[start+i0*linelen+linelen-1:start+i1*linelen:linelen] != ord('\n')):
+            raise ValueError('"{}" has lines of different lengths'.format(path))
+        block = fields[i0:i1]
+        data = {c : convert(block[:,i], dtype) for i, c in cols}
+        if index:
+            idx = block[:,0]
+            for typ in (int, float):
+                try:
+                    idx = idx.astype(typ)
+                    break
+                except ValueError:
+                    continue
+            else:
+                idx = np.char.strip(idx).astype(str).astype(object)
+            idx = pd.Index(idx)
+        else:
+            idx = pd.RangeIndex(i0, i1)
+        return pd.DataFrame(data, index=idx, columns=[c for i, c in cols])
 
-def ReadCdatFile2Pandas(path, nskip=2, hashspace=True):
+    if chunksize is None:
+        return readrows(0, nrow)
+    return (readrows(i0, min(i0 + chunksize, nrow)) for i0 in range(0, nrow, chunksize))
+
+def ReadCdatFile2Pandas(path, nskip=2, hashspace=True, usecols=None, rows=None,
+                        cache=True):
     """Read Phil Robinson cdat savefile format into a Pandas Dataframe
     with no cdat dependencies.
+    Single pass: only the header region is scanned for column names, then the
+    numeric body is parsed from the same file position by pandas' C tokenizer.
     path --> path to file
     nskip --> number of header rows to skip to reach data (header row index is nskip-1)
                 2 for cdat with no variable information,
                 1 for jpowell,
                -1 for automatic (standard cdat format). hashspace must be True
     hashspace --> True if space between # and first header
+    usecols --> list of column names (or indices) to read. None for all
+    rows --> (start, stop) range of data rows to read. None for all
+    cache --> read through binary parse cache (see `parsecache`), False to always parse text
+    """
+    return parsecache.CachedRead(path, _ReadCdatFile2Pandas, cache=cache,
+                        nskip=nskip, hashspace=hashspace, usecols=usecols, rows=rows)
+
+def _ReadCdatFile2Pandas(path, nskip=2, hashspace=True, usecols=None, rows=None):
+    """Parse cdat text file for `ReadCdatFile2Pandas` (uncached)
     """
-    #GET COLUMN HEADERS
     with open(path) as f:
-        #Read file lines into list
-        content = f.readlines()
-        #strip newline \n characters
-        content = [x.strip() for x in content]
-        #Get column title keys from header row
+        #GET COLUMN HEADERS
         if nskip < 0:
             #Automatically find row with header keys, find 1st row with numbers
                 #Only works if header section is prepended with '#'
-            for i, l in enumerate(content):
-                if l[0] != '#':
+            keys = ''
+            while True:
+                pos = f.tell()
+                line = f.readline()
+                if not line or line.strip()[:1] != '#':
                     #this is the first line of data, previous line was header
-                    nskip = i
+                    f.seek(pos)
                     break
-        keys = content[nskip-1]
+                keys = line
+        else:
+            for i in range(nskip):
+                keys = f.readline()
         #split column titles by whitespace
         keys = keys.split()
         #drop leading '#'
@@ -338,12 +669,13 @@ def ReadCdatFile2Pandas(path, nskip=2, hashspace=True):
         else:
             keys[0] = keys[0].replace('#', '')
 
-    #READ DATA
-        #data separated in fixed-width format
-        #stip 1st info row and 2nd header row
-        #supply header names manually
-    # df = pd.read_fwf(path, skiprows=nskip, names=keys )
-    df = pd.read_csv(path, skiprows=nskip, names=keys, delim_whitespace=True)
+        #READ DATA
+            #data separated by whitespace, continue from end of header
+            #supply header names manually
+        start, stop = (0, None) if rows is None else rows
+        nrows = None if stop is None else max(stop - start, 0)
+        df = pd.read_csv(f, sep=r'\s+', header=None, names=keys,
+                         usecols=usecols, skiprows=start, nrows=nrows)
 
     return df
 
@@ -0,0 +1,391 @@
+"""PARSE CACHE FOR TEXT DATASETS
+Logan Halstrom
+CREATED:  18 OCT 2026
+MODIFIED: 18 OCT 2026
+
+DESCRIPTION:  Transparent binary cache of parsed text datasets (e.g. cdat).
+The first read of a file parses the text and saves each column of the
+resulting DataFrame as a `.npy` file in a cache entry keyed on the source
+file's path, size and modification time (and the reader options).  Later
+reads memory-map the cached columns instead of parsing text.  Entries of
+modified files are invalidated, and the least recently used entries are
+evicted when the cache exceeds its maximum size.  Cache hits return the same
+frame as the parse: string columns keep their nulls and column labels keep
+their types (frames that cannot be stored this way are not cached).
+
+HOW TO USE:
+    import parsecache
+    df = parsecache.CachedRead('data.cdat', reader, nskip=2)  # reader(path, **kwargs)
+    parsecache.SetCacheEnabled(False)   # or environment variable PARSECACHE=0
+    parsecache.SetCacheDir('/scratch/me/parsecache')
+    parsecache.SetCacheMaxSize(10e9)
+    parsecache.ClearCache()
+    python parsecache.py                # verify cache hits match parsed frames
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+#CACHE SETTINGS
+_settings = {
+    'enabled' : os.environ.get('PARSECACHE', '1') not in ('0', 'false', 'False', 'off'),
+    'dir'     : os.environ.get('PARSECACHE_DIR',
+                    os.path.join(os.path.expanduser('~'), '.cache', 'parsecache')),
+    'maxsize' : float(os.environ.get('PARSECACHE_MAXSIZE', 4e9)),
+}
+
+def SetCacheEnabled(enabled=True):
+    """ Turn parse cache on/off (off: every read parses the text file)
+    """
+    _settings['enabled'] = bool(enabled)
+
+def SetCacheDir(path):
+    """ Set directory to store cache entries in
+    """
+    _settings['dir'] = path
+
+def SetCacheMaxSize(nbytes):
+    """ Set maximum total size of cache entries [bytes].
+    Least recently used entries are evicted beyond this size
+    """
+    _settings['maxsize'] = float(nbytes)
+    _Evict()
+
+def CacheKey(path, reader, kwargs):
+    """ Get cache entry name and source file stamp for a read.
+    Keyed on absolute path, size, modification time, reader and its options
+    path   --> path to source file
+    reader --> function that parses source file
+    kwargs --> reader options
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stamp = {'path' : path, 'size' : st.st_size, 'mtime' : st.st_mtime_ns,
+             'reader' : '{}.{}'.format(reader.__module__, reader.__qualname__),
+             'kwargs' : repr(sorted(kwargs.items()))}
+    key = hashlib.sha1(json.dumps(stamp, sort_keys=True).encode()).hexdigest()
+    return key, stamp
+
+def CachedRead(path, reader, cache=True, **kwargs):
+    """ Read a text dataset with `reader(path, **kwargs)`, through the parse cache.
+    Returns DataFrame with memory-mapped (copy-on-write) columns on cache hits
+    path   --> path to source file
+    reader --> function that parses source file into a DataFrame
+    cache  --> False to bypass cache for this read
+    kwargs --> reader options (part of cache key)
+    """
+    if not (cache and _settings['enabled']):
+        return reader(path, **kwargs)
+
+    key, stamp = CacheKey(path, reader, kwargs)
+    entry = os.path.join(_settings['dir'], key)
+    if os.path.isfile(os.path.join(entry, 'meta.json')):
+        try:
+            df = _LoadEntry(entry)
+            #mark as recently used
+            os.utime(os.path.join(entry, 'meta.json'))
+            return df
+        except (OSError, ValueError, KeyError):
+            #corrupt entry, rebuild
+            shutil.rmtree(entry, ignore_errors=True)
+
+    df = reader(path, **kwargs)
+    try:
+        _Invalidate(stamp)
+        _SaveEntry(entry, df, stamp)
+        _Evict()
+    except OSError:
+        #cache is best-effort (e.g. read-only or full disk)
+        pass
+    return df
+
+def _SaveEntry(entry, df, stamp):
+    """ Save DataFrame columns to cache entry (written to a temporary
+    directory, then renamed into place)
+    """
+    tmp = '{}.{}.tmp'.format(entry, os.getpid())
+    try:
+        SaveColumns(tmp, df, stamp)
+    except TypeError:
+        #frame has values/labels with no binary form, leave it uncached
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp, entry)
+
+def _LoadEntry(entry):
+    """ Memory-map columns of cache entry into DataFrame
+    """
+    return LoadColumns(entry, mmap_mode='c')
+
+########################################################################
+### COLUMN STORE #######################################################
+########################################################################
+
+#null kinds of string columns, saved as int8 codes alongside the strings
+_nullkinds = (None, np.nan, pd.NA)
+
+def _EncodeLabel(label):
+    """ Make a column/index label JSON-storable, keeping its type
+    """
+    if isinstance(label, np.generic):
+        label = label.item()
+    if isinstance(label, tuple):
+        return {'tuple' : [_EncodeLabel(x) for x in label]}
+    if label is None or isinstance(label, (str, bool, int, float)):
+        return label
+    raise TypeError('Cannot store label {!r} of type {}'.format(label, type(label).__name__))
+
+def _DecodeLabel(label):
+    """ Restore label saved with `_EncodeLabel`
+    """
+    if isinstance(label, dict):
+        return tuple(_DecodeLabel(x) for x in label['tuple'])
+    return label
+
+def _SaveArray(path, name, values):
+    """ Save column/index values as .npy file(s).
+    Strings are stored as fixed-width unicode (no pickling), with an int8
+    null code file ('<name>.null.npy') marking None/NaN/NA entries.
+    Returns (dtype, null file name or None)
+    path   --> directory to save to
+    name   --> file name
+    values --> Series or Index to save
+    """
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype) and dtype != object:
+        np.save(os.path.join(path, name), values.to_numpy())
+        return str(dtype), None
+    if not (dtype == object or isinstance(dtype, pd.StringDtype)):
+        raise TypeError('Cannot store values of dtype {}'.format(dtype))
+
+    values = values.to_numpy(dtype=object, copy=True)
+    isnull = pd.isna(values)
+    if not all(isinstance(x, str) for x in values[~isnull]):
+        raise TypeError('Cannot store object values that are not all strings')
+    nulls = None
+    if isnull.any():
+        codes = np.zeros(len(values), dtype=np.int8)
+        for i in np.flatnonzero(isnull):
+            x = values[i]
+            codes[i] = 1 if x is None else 3 if x is pd.NA else 2
+            values[i] = ''
+        nulls = name.replace('.npy', '.null.npy')
+        np.save(os.path.join(path, nulls), codes)
+    np.save(os.path.join(path, name), values.astype(str))
+    return str(dtype), nulls
+
+def _LoadArray(path, name, dtype, nulls=None, mmap_mode=None):
+    """ Load values saved with `_SaveArray`. Numeric values are memory-mapped
+    (if `mmap_mode`), strings are restored as objects with their nulls
+    """
+    values = np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+    if dtype == 'object' or values.dtype.kind == 'U':
+        values = values.astype(object)
+        if nulls is not None:
+            codes = np.load(os.path.join(path, nulls))
+            for code in np.unique(codes[codes > 0]):
+                values[codes == code] = _nullkinds[code - 1]
+        if dtype != 'object':
+            #pandas string dtype
+            values = pd.array(values, dtype=dtype)
+    return values
+
+def SaveColumns(path, df, meta=None):
+    """ Save DataFrame to a directory: one .npy file per column (and index,
+    unless default), layout in 'meta.json'.  Strings keep their nulls and
+    column/index labels keep their types.  Raises TypeError for values or
+    labels with no binary form (e.g. mixed-type object columns).
+    Returns meta dictionary
+    path --> directory to save to (created if needed)
+    df   --> DataFrame to save
+    meta --> dictionary of extra JSON-storable information to save in 'meta.json'
+    """
+    os.makedirs(path, exist_ok=True)
+    columns = [_EncodeLabel(c) for c in df.columns]
+    files, dtypes, nulls = [], [], []
+    for i in range(df.shape[1]):
+        files.append('col{}.npy'.format(i))
+        dtype, null = _SaveArray(path, files[-1], df.iloc[:, i])
+        dtypes.append(dtype)
+        nulls.append(null)
+    index, indexdtype, indexnulls = None, None, None
+    if not (isinstance(df.index, pd.RangeIndex) and df.index.start == 0
+                and df.index.step == 1):
+        if isinstance(df.index, pd.MultiIndex):
+            raise TypeError('Cannot store MultiIndex')
+        index = 'index.npy'
+        indexdtype, indexnulls = _SaveArray(path, index, df.index)
+    meta = dict(meta or {}, columns=columns, files=files, dtypes=dtypes, nulls=nulls,
+                index=index, indexdtype=indexdtype, indexnulls=indexnulls,
+                indexname=_EncodeLabel(df.index.name), nrows=len(df),
+                columnsdtype=str(df.columns.dtype))
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+def ReadMeta(path):
+    """ Read layout of directory saved with `SaveColumns`, with labels restored
+    """
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    meta['columns'] = [_DecodeLabel(c) for c in meta['columns']]
+    meta['indexname'] = _DecodeLabel(meta.get('indexname'))
+    return meta
+
+def LoadColumn(path, meta, col, mmap_mode=None):
+    """ Load one column saved with `SaveColumns`
+    path      --> directory saved to
+    meta      --> layout (see `ReadMeta`)
+    col       --> column label
+    mmap_mode --> memory-map numeric columns (see `numpy.load`) [None]
+    """
+    i = meta['columns'].index(col)
+    nulls = meta.get('nulls') or [None] * len(meta['files'])
+    return _LoadArray(path, meta['files'][i], meta['dtypes'][i], nulls[i],
+                      mmap_mode=mmap_mode)
+
+def LoadIndex(path, meta):
+    """ Load index saved with `SaveColumns`
+    """
+    if meta['index'] is None:
+        return pd.RangeIndex(meta['nrows'], name=meta['indexname'])
+    values = _LoadArray(path, meta['index'], meta.get('indexdtype') or 'object',
+                        meta.get('indexnulls'))
+    return pd.Index(values, name=meta['indexname'])
+
+def LoadColumns(path, mmap_mode=None):
+    """ Load DataFrame saved with `SaveColumns`
+    path      --> directory saved to
+    mmap_mode --> memory-map numeric columns (see `numpy.load`) [None]
+    """
+    meta = ReadMeta(path)
+    cols = [LoadColumn(path, meta, c, mmap_mode) for c in meta['columns']]
+    #build from positions so duplicate/non-string labels are kept as is,
+        #copy=False keeps columns memory-mapped
+    df = pd.DataFrame(dict(enumerate(cols)), index=LoadIndex(path, meta), copy=False)
+    df.columns = pd.Index(meta['columns'], dtype=meta.get('columnsdtype'))
+    return df
+
+def _Entries():
+    """ List (last use time, size, entry path, meta) of cache entries
+    """
+    entries = []
+    if not os.path.isdir(_settings['dir']):
+        return entries
+    for name in os.listdir(_settings['dir']):
+        entry = os.path.join(_settings['dir'], name)
+        metafile = os.path.join(entry, 'meta.json')
+        if not os.path.isfile(metafile):
+            continue
+        try:
+            with open(metafile) as f:
+                meta = json.load(f)
+            size = sum(e.stat().st_size for e in os.scandir(entry))
+            entries.append((os.stat(metafile).st_mtime, size, entry, meta))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+def _Invalidate(stamp):
+    """ Remove entries of an older version of a source file (same path and
+    reader, different size or modification time)
+    """
+    for t, size, entry, meta in _Entries():
+        if meta['path'] == stamp['path'] and meta['reader'] == stamp['reader'] \
+                and (meta['size'], meta['mtime']) != (stamp['size'], stamp['mtime']):
+            shutil.rmtree(entry, ignore_errors=True)
+
+def _Evict():
+    """ Remove least recently used entries until cache fits maximum size
+    """
+    entries = sorted(_Entries())
+    total = sum(e[1] for e in entries)
+    while entries and total > _settings['maxsize']:
+        t, size, entry, meta = entries.pop(0)
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+def ClearCache(path=None):
+    """ Remove cache entries of a source file, or all entries
+    path --> source file path. None for all entries
+    """
+    if path is not None:
+        path = os.path.abspath(path)
+    for t, size, entry, meta in _Entries():
+        if path is None or meta['path'] == path:
+            shutil.rmtree(entry, ignore_errors=True)
+
+def CacheInfo():
+    """ Get cache directory, number of entries, total size [bytes], and settings
+    """
+    entries = _Entries()
+    return {'dir' : _settings['dir'], 'entries' : len(entries),
+            'size' : sum(e[1] for e in entries),
+            'maxsize' : _settings['maxsize'], 'enabled' : _settings['enabled']}
+
+########################################################################
+### VERIFICATION #######################################################
+########################################################################
+
+def _ReadWhitespace(path):
+    """ Whitespace-delimited text reader for `Verify`
+    """
+    return pd.read_csv(path, sep=r'\s+')
+
+def Verify():
+    """ Check that cache hits and column store round trips return the same
+    frame as the original (values, nulls, dtypes, labels).
+    Returns True if all checks pass
+    """
+    import tempfile
+    print('Parse cache verification')
+    frames = {
+        'nulls' : pd.DataFrame({'s' : ['a', None, np.nan, 'd'],
+                                'x' : [1.5, np.nan, 3.0, 4.0],
+                                'i' : np.arange(4)}),
+        'labels' : pd.DataFrame({0 : [1.0, 2.0], 1 : ['u', 'v'], (2, 'b') : [3, 4]},
+                                index=pd.Index(['r0', None], name=7)),
+        'empty' : pd.DataFrame({'x' : np.zeros(0)}),
+    }
+    ok = True
+    olddir = _settings['dir']
+    with tempfile.TemporaryDirectory() as tmp:
+        _settings['dir'] = os.path.join(tmp, 'cache')
+        try:
+            #cache miss vs. hit on a text file with missing text entries
+            path = os.path.join(tmp, 'data.dat')
+            with open(path, 'w') as f:
+                f.write('time name val\n0 a 1.5\n1 NaN 2.5\n2 b NaN\n')
+            frames['text'] = CachedRead(path, _ReadWhitespace)
+            checks = {'cache hit' : (frames['text'], CachedRead(path, _ReadWhitespace))}
+            for name, df in frames.items():
+                SaveColumns(os.path.join(tmp, name), df)
+                checks[name] = (df, LoadColumns(os.path.join(tmp, name), mmap_mode='c'))
+        finally:
+            _settings['dir'] = olddir
+
+        for name, (df, loaded) in checks.items():
+            try:
+                #copy: memory-mapped columns are numpy.memmap
+                pd.testing.assert_frame_equal(df, loaded.copy())
+                #None and NaN are both nulls to pandas, check which is which
+                same = [x is None for x in df.to_numpy(dtype=object).ravel()] \
+                        == [x is None for x in loaded.to_numpy(dtype=object).ravel()]
+            except AssertionError as e:
+                same = False
+                print('    {}: {}'.format(name, e))
+            print('    {:<10} {}'.format(name, 'ok' if same else 'FAILED'))
+            ok = ok and same
+    print('    CHECKS OUT!' if ok else '    FAILED!')
+    return ok
+
+if __name__ == "__main__":
+
+    if not Verify():
+        raise SystemExit(1)
@@ -18,6 +18,10 @@ To convert units of `unconverted` from feet to meters without using classes:
     ft2m = units.convert('ft', 'm')
     converted = ft2m * unconverted
 
+To convert compound/derived unit expressions (built from available units):
+    converted = units.convert('lbf*s^2/ft', 'kg', unconverted)
+    converted = units.convert('slug/(ft s)', 'kg/(m*s)', unconverted)
+
 To get list of available units to convert:
     units.gethelp()
 
@@ -28,14 +32,33 @@ To create a unit-tracking object for DataFrame `df`:
     df = dat.GetData()
     units = dat.GetUnits()
 
+To stream-convert a large delimited text file to SI (column units from
+header names like 'V[ftps]', a unit row, or a header file):
+    units.convertfile('data_uscs.dat', 'data_si.dat', convto='SI')
+    # or from the command line:
+    python units.py convert data_uscs.dat data_si.dat --to SI
+
+To save a tracked dataset and open it again (columns are read lazily):
+    dat.Save('example_dir')
+    dat = units.UnitTracker.Load('example_dir')
+    x = dat.GetColumn('var1', unit='m')
+
 
 ToDo:
     Clean up, make doc-strings
 """
 
+from functools import lru_cache
+from types import MappingProxyType
+import os
+import re
+import time
+
 import numpy as np
 import pandas as pd
 
+import parsecache
+
 class UnitTracker():
     """ Class definition for unit tracker
     """
@@ -58,15 +81,21 @@ class UnitTracker():
 
         self.name = name
 
+        #on-disk columns not yet read (see `Load`)
+        self._store = None
 
         if data is None:
             self.data = pd.DataFrame()
         else:
             self.data = data.copy()
 
-        self.pars = pars
-        if self.pars is None:
-            self.pars = pd.DataFrame(columns=['unit', 'info'])
+        #parameter store: insertion-ordered dicts with O(1) add/update/lookup,
+            #`pars` DataFrame is built from them only when accessed
+        self._units = {}
+        self._info = {}
+        self._pars = None
+        if pars is not None:
+            self.pars = pars
 
         # #Might want to make this a dataframe to cross-correlate units,labels,etc with keys**********************************
         # self.unit = unit
@@ -92,6 +121,63 @@ class UnitTracker():
 
         return string
 
+    @property
+    def data(self):
+        """ Dataset DataFrame. For trackers opened lazily with `Load`, columns
+        not yet read are loaded from disk on first access
+        """
+        if self._store is not None:
+            store, self._store = self._store, None
+            missing = [c for c in store['columns'] if c not in self._data]
+            if missing:
+                for c in missing:
+                    self._data[c] = self._ReadColumn(store, c, copy=True)
+                self._data = self._data[store['columns']]
+            if store['series']:
+                self._data = self._data.iloc[0]
+        return self._data
+
+    @data.setter
+    def data(self, df):
+        self._data = df
+        self._store = None
+
+    @property
+    def pars(self):
+        """ DataFrame of parameter information (index: parameter, columns: unit, info).
+        Built from the parameter store on access.  Edits to it (e.g.
+        `pars.loc['x', 'unit'] = 'm'`, new rows) are pulled back into the
+        store by the next tracker method, then it is rebuilt on next access
+        """
+        if self._pars is None:
+            self._pars = pd.DataFrame({'unit' : pd.Series(self._units, dtype=object),
+                                       'info' : pd.Series(self._info, dtype=object)},
+                                      index=pd.Index(list(self._units), dtype=object),
+                                      columns=['unit', 'info'])
+        return self._pars
+
+    @pars.setter
+    def pars(self, df):
+        """ Replace parameter store with contents of DataFrame
+        Args:
+            df (:obj:`~pandas.DataFrame`): parameter information with 'unit' and (optional) 'info' columns
+        """
+        units = df['unit'] if 'unit' in df else pd.Series('-', index=df.index)
+        info = df['info'] if 'info' in df else pd.Series('', index=df.index)
+        self._units = dict(zip(df.index, units))
+        self._info = dict(zip(df.index, info))
+        self._pars = None
+
+    def _PullPars(self):
+        """ Pull edits of the `pars` DataFrame handed out on access back into
+        the parameter store (no-op if not accessed since last change)
+        """
+        if self._pars is not None:
+            pars = self._pars
+            self.pars = pars
+            #keep it live, it may still be edited
+            self._pars = pars
+
     def SetData(self, df):
         """ Set dataset DataFrame
         Args:
@@ -107,40 +193,188 @@ class UnitTracker():
         return self.data.copy()
 
     def SetUnits(self, units):
-        """ Set units that map to dataset
+        """ Set units that map to dataset. Parameters not yet tracked are added
         Args:
             units (:obj:`dict`): units mapping
         """
-        self.pars['unit'] = pd.Series(units)
+        self._PullPars()
+        for par, unit in units.items():
+            self._units[par] = unit
+            self._info.setdefault(par, '')
+        self._pars = None
 
     def GetUnits(self,):
         """ Get units that map to dataset
         Returns:
             (:obj:`dict`): units mapping
         """
-        return dict(self.pars['unit'])
+        self._PullPars()
+        return dict(self._units)
 
     def AddParameter(self, par, unit='-', info=''):
-        """ Add a parameter to the tracker
+        """ Add a parameter to the tracker (or update it, if already tracked)
         Args:
             par  (:obj:`str`): Name of variable key
             unit (:obj:`str`): Units of the variable
             info (:obj:`str`): Optional information about the variable ['']
         """
+        self._PullPars()
+        self._units[par] = unit
+        self._info[par] = info
+        self._pars = None
 
-        self.pars = self.pars.append(
-            pd.Series(name=par, data={'unit':unit,'info':info}),
-            # ignore_index=True
-            )
+    def AddParameters(self, pars):
+        """ Add (or update) many parameters to the tracker at once
+        Args:
+            pars (:obj:`dict` or :obj:`str`): mapping of parameter name to unit,
+                (unit, info) tuple, or dict with 'unit'/'info' keys.
+                Or path to a header file with one parameter per line:
+                'name unit [info]' (whitespace or comma delimited, '#' comments)
+        """
+        if isinstance(pars, (str, os.PathLike)):
+            pars = readheader(pars)
+        self._PullPars()
+
+        for par, val in pars.items():
+            if isinstance(val, str):
+                unit, info = val, ''
+            elif isinstance(val, dict):
+                unit, info = val.get('unit', '-'), val.get('info', '')
+            else:
+                unit, info = (tuple(val) + ('',))[:2]
+            self._units[par] = unit
+            self._info[par] = info
+        self._pars = None
+
+    def GetParameter(self, par):
+        """ Get information of a tracked parameter
+        Args:
+            par  (:obj:`str`): Name of variable key
+        Returns:
+            (:obj:`tuple`): (unit, info) of parameter
+        """
+        self._PullPars()
+        return self._units[par], self._info[par]
 
-    def ConvertUnits(self, convto='SI', verbose=False):
+    def ConvertUnits(self, convto='SI', verbose=False, copy=True):
         """ Batch-convert a dataset between standard imperial and metric (SI)
         Args:
             convto (:obj:`str`): standard system of units to convert to ['SI']
+            copy (:obj:`bool`): convert a copy of the dataset. False converts
+                                the contained dataset in place, avoiding the
+                                extra copy of large datasets [True]
+        Returns:
+            (:obj:`int`): number of data bytes touched by conversion
         """
-        self.data, units = batchconvert(self.GetData(), self.GetUnits(),
-                                        convto=convto, verbose=verbose)
+        data = self.GetData() if copy else self.data
+        self.data, units, nbytes = batchconvert(data, self.GetUnits(),
+                                        convto=convto, verbose=verbose,
+                                        returnbytes=True)
         self.SetUnits(units)
+        return nbytes
+
+    def GetColumn(self, col, unit=None, convto=None):
+        """ Get a single column of the dataset, optionally converted.
+        For trackers opened lazily with `Load`, only this column is read
+        (memory-mapped) and only this column is converted.
+        Args:
+            col (:obj:`str`): Name of variable key
+            unit (:obj:`str`): unit to convert to [None, no conversion]
+            convto (:obj:`str`): standard system of units to convert to, e.g. 'SI' [None]
+        Returns:
+            (:obj:`~pandas.Series`): column data
+        """
+        if self._store is not None and col not in self._data:
+            values = self._ReadColumn(self._store, col)
+            index = self._data.index
+        else:
+            values = self.data[col].to_numpy()
+            index = self.data.index
+
+        self._PullPars()
+        cur = self._units.get(col, '-')
+        if unit is None and convto is not None and cur != '-':
+            unit = standardunit(cur, unitsystem(convto))
+        if unit is not None and cur != '-':
+            values = convert(cur, unit, values)
+        return pd.Series(values, index=index, name=col)
+
+    def Save(self, path):
+        """ Save dataset and parameter information to a directory.
+        Each column is stored as a separate binary .npy file (memory-mappable
+        on `Load`, see `parsecache.SaveColumns`), parameter units/info in
+        'pars.csv', layout in 'meta.json'
+        Args:
+            path (:obj:`str`): directory to save to (created if needed)
+        """
+        data = self.data
+        series = isinstance(data, pd.Series)
+        if series:
+            #one-row frame, indexed by series name
+            name = data.name
+            data = data.to_frame().T.infer_objects()
+            data.index = pd.Index([name])
+        self._PullPars()
+        parsecache.SaveColumns(path, data, {'name' : self.name, 'series' : series})
+        self.pars.to_csv(os.path.join(path, 'pars.csv'), index_label='par')
+
+    @classmethod
+    def Load(cls, path, columns=None, lazy=True):
+        """ Load tracker saved with `Save`.
+        Args:
+            path (:obj:`str`): directory saved to
+            columns (:obj:`list`): columns to read immediately [None]
+            lazy (:obj:`bool`): defer reading other columns until accessed
+                                (`data` reads all, `GetColumn` reads one) [True]
+        Returns:
+            (:obj:`UnitTracker`): loaded tracker
+        """
+        meta = parsecache.ReadMeta(path)
+        pars = pd.read_csv(os.path.join(path, 'pars.csv'), index_col=0,
+                            dtype=str, keep_default_na=False)
+        #csv labels are text, restore labels of saved columns (e.g. integers)
+        labels = {str(c) : c for c in meta['columns']}
+        pars.index = pd.Index([labels.get(p, p) for p in pars.index], dtype=object)
+
+        store = dict(meta, path=path)
+        self = cls(name=meta['name'], pars=pars)
+        self._data = pd.DataFrame(index=parsecache.LoadIndex(path, meta))
+        self._store = store
+        for c in (columns or []):
+            self._data[c] = self._ReadColumn(store, c, copy=True)
+        if not lazy:
+            self.data
+        return self
+
+    @staticmethod
+    def _ReadColumn(store, col, copy=False):
+        """ Memory-map one saved column (read-only, unless copied)
+        """
+        values = parsecache.LoadColumn(store['path'], store, col, mmap_mode='r')
+        return np.array(values) if copy and isinstance(values, np.memmap) else values
+
+def readheader(path):
+    """ Read parameter names, units and descriptions from a header file.
+    One parameter per line: 'name unit [info]', whitespace or comma
+    delimited. Blank lines and lines starting with '#' are skipped.
+    Args:
+        path (:obj:`str`): path to header file
+    Returns:
+        (:obj:`dict`): mapping of parameter name to (unit, info)
+    """
+    pars = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if ',' in line:
+                fields = [x.strip() for x in line.split(',', 2)]
+            else:
+                fields = line.split(None, 2)
+            fields += ['-', ''][len(fields) - 1:]
+            pars[fields[0]] = (fields[1], fields[2])
+    return pars
 
 #UNIT CONVERSIONS
     #enter conversions relative to standard imperial units.
@@ -149,71 +383,342 @@ class UnitTracker():
     #sys: which system the units belong to (e.g. 'SI' for metric, 'USCS' for United States customary system)
     #std: boolean flag if these units are the standard for their system (use for batch conversion)
 
-convdf = pd.DataFrame([
+#(name, conv, info, sys, std, type)
+unittable = (
     #DISTANCE
-    pd.Series(name='m' ,  data={'conv':1.0,           'info':'meters', 'sys':'SI',   'std':1, 'type':'length'}),
-    pd.Series(name='ft',  data={'conv':1/0.3048,      'info':'feet'  , 'sys':'USCS', 'std':1, 'type':'length'}),
-    pd.Series(name='in',  data={'conv':1/0.3048*12.0, 'info':'inches', 'sys':'USCS', 'std':0, 'type':'length'}),
-    pd.Series(name='mi' , data={'conv':1/0.3048/5280, 'info':'miles' , 'sys':'USCS', 'std':0, 'type':'length'}),
-    pd.Series(name='nmi', data={'conv':1/0.3048/6076.11548556, 'info':'nautical miles', 'sys':'USCS', 'std':0, 'type':'length'}),
-
-    #SPEED
+    ('m',   1.0,                     'meters',         'SI',   1, 'length'),
+    ('ft',  1/0.3048,                'feet',           'USCS', 1, 'length'),
+    ('in',  1/0.3048*12.0,           'inches',         'USCS', 0, 'length'),
+    ('mi',  1/0.3048/5280,           'miles',          'USCS', 0, 'length'),
+    ('nmi', 1/0.3048/6076.11548556,  'nautical miles', 'USCS', 0, 'length'),
 
     #MASS
-    pd.Series(name='kg'  , data={'conv':1.0,          'info':'kilograms',        'sys':'SI',   'std':1, 'type':'mass' }),
-    pd.Series(name='lb'  , data={'conv':2.20462,      'info':'Pounds-mass'     , 'sys':'USCS', 'std':0, 'type':'mass' }),
-    pd.Series(name='slug', data={'conv':1/14.5939029, 'info':'slugs=lbf*s^2/ft', 'sys':'USCS', 'std':1, 'type':'mass' }),
-    # pd.Series(name='slug', data={'conv':0.068521765561961, 'info':'slugs=lbf*s^2/ft', 'sys':'USCS', 'std':1 }),
-
-
+    ('kg',   1.0,          'kilograms',        'SI',   1, 'mass'),
+    ('lb',   2.20462,      'Pounds-mass',      'USCS', 0, 'mass'),
+    ('slug', 1/14.5939029, 'slugs=lbf*s^2/ft', 'USCS', 1, 'mass'),
 
     #FORCE
-    pd.Series(name='N'  , data={'conv':1.0,        'info':'Newtons',      'sys':'SI',   'std':1, 'type':'force' }),
-    pd.Series(name='lbf', data={'conv':1/4.448221, 'info':'Pounds-force', 'sys':'USCS', 'std':1, 'type':'force' }),
+    ('N',   1.0,        'Newtons',      'SI',   1, 'force'),
+    ('lbf', 1/4.448221, 'Pounds-force', 'USCS', 1, 'force'),
 
     #PRESSURE
-    pd.Series(name='Pa' , data={'conv':1.0,                  'info':'pascals, N/m^2',         'sys':'SI',   'std':1, 'type':'pressure' }),
-    pd.Series(name='psf', data={'conv':1/47.880258889,       'info':'pounds per square foot', 'sys':'USCS', 'std':1, 'type':'pressure' }),
-    pd.Series(name='psi', data={'conv':1/47.880258889*144.0, 'info':'pounds per square inch', 'sys':'USCS', 'std':0, 'type':'pressure' }),
+    ('Pa',  1.0,                  'pascals, N/m^2',         'SI',   1, 'pressure'),
+    ('psf', 1/47.880258889,       'pounds per square foot', 'USCS', 1, 'pressure'),
+    ('psi', 1/47.880258889*144.0, 'pounds per square inch', 'USCS', 0, 'pressure'),
 
-    #ABSOLUTE TEMPERATURE
-    pd.Series(name='K', data={'conv':1.0, 'info':'Kelvin',                      'sys':'SI',   'std':1, 'type':'temperature' }),
-    pd.Series(name='R', data={'conv':1.8, 'info':'Degrees Rankine (K=5/9degR)', 'sys':'USCS', 'std':1, 'type':'temperature' }),
+    #ABSOLUTE TEMPERATURE (degC/degF are affine, see `unitoffsets`)
+    ('K',    1.0, 'Kelvin',                      'SI',   1, 'temperature'),
+    ('R',    1.8, 'Degrees Rankine (K=5/9degR)', 'USCS', 1, 'temperature'),
+    ('degC', 1.0, 'Degrees Celsius',             'SI',   0, 'temperature'),
+    ('degF', 1.8, 'Degrees Fahrenheit',          'USCS', 0, 'temperature'),
 
-    # #NON-DIMENSIONAL OR NO UNITS
-    # pd.Series(name='-', data={'conv':1.0, 'info':'no unit', 'sys':'SI',  'std':1,'type':'None' }),
-    # pd.Series(name='-', data={'conv':1.0, 'info':'no unit', 'sys':'USCS','std':1,'type':'None' }),
+    #TEMPERATURE DIFFERENCE
+    ('dK', 1.0, 'Kelvin temperature difference',      'SI',   1, 'dtemperature'),
+    ('dR', 1.8, 'Rankine temperature difference',     'USCS', 1, 'dtemperature'),
+    ('dC', 1.0, 'Celsius temperature difference',     'SI',   0, 'dtemperature'),
+    ('dF', 1.8, 'Fahrenheit temperature difference',  'USCS', 0, 'dtemperature'),
 
+    #MORE CONVERSIONS (DERIVATIVE)
 
-    # #for checkout only
-    # pd.Series(name='inps', data={'conv':1.8, 'info':'test', 'sys':'USCS', 'std':1, 'type':'speed' }),
-    # pd.Series(name='ftps', data={'conv':1.8, 'info':'test', 'sys':'USCS', 'std':1, 'type':'speed' }),
-    # pd.Series(name='mps',  data={'conv':1.8, 'info':'test', 'sys':'SI', 'std':1, 'type':'speed' }),
-])
+    #AREA
+    ('m2',  1.0,           'm^2',  'SI',   1, 'area'),
+    ('ft2', (1/0.3048)**2, 'ft^2', 'USCS', 1, 'area'),
 
-#dict to simplify conversion syntax
-conversions = dict(convdf['conv'])
+    #SPEED
+    ('mps',  1.0,      'm/s',  'SI',   1, 'speed'),
+    ('ftps', 1/0.3048, 'ft/s', 'USCS', 1, 'speed'),
+
+    #DENSITY
+    ('kgpm3',    1.0,                             'Density (kg/m^3)',    'SI',   1, 'density'),
+    ('slugpft3', (1/14.5939029)/(1/0.3048)**3,    'Density (slug/ft^3)', 'USCS', 1, 'density'),
+
+    #DYNAMIC VISCOSITY
+    ('kgspm',    1.0,                         'Dynamic Viscosity (mu) [kg*s/m]',    'SI',   1, 'dvisc'),
+    ('slugspft', (1/14.5939029)/(1/0.3048),   'Dynamic Viscosity (mu) [slug*s/ft]', 'USCS', 1, 'dvisc'),
+)
+#columns of `unittable` after unit name (and of `convdf`)
+unitcols = ('conv', 'info', 'sys', 'std', 'type')
+
+#offsets of affine units (unit = SI * conv + offset)
+unitoffsets = {
+    'degC' : -273.15,
+    'degF' : -459.67,
+}
+
+class UnitRegistry():
+    """ Immutable, precompiled form of a unit conversion table (`unittable`).
+    Holds dense conversion factor and offset matrices indexed by unit id and
+    a map from (type, system) to standard unit, so every conversion is an
+    O(1) lookup plus a single multiply (and add, for affine units like degC).
+    """
 
-#MORE CONVERSIONS (DERIVATIVE)
+    def __init__(self, table, offsets={}):
+        """ Compile conversion table
 
-#AREA
-convdf = convdf.append(pd.Series(name='m2',  data={'conv':1.0,                  'info':'m^2',  'sys':'SI',   'std':1, 'type':'area' }))
-convdf = convdf.append(pd.Series(name='ft2', data={'conv':conversions['ft']**2, 'info':'ft^2', 'sys':'USCS', 'std':1, 'type':'area'}))
+        Args:
+            table (:obj:`tuple`): unit conversion table rows of (name, conv, info, sys, std, type)
+            offsets (:obj:`dict`): offset of affine units (unit = SI * conv + offset) [{}]
+        """
+        units = tuple(row[0] for row in table)
+        types = tuple(row[5] for row in table)
+        conv = np.array([row[1] for row in table], dtype=float)
+        offset = np.array([offsets.get(u, 0.0) for u in units], dtype=float)
+        #factor[i,j] converts unit i to unit j: new = old * factor + offset
+        factors = conv[np.newaxis, :] / conv[:, np.newaxis]
+        offsetmat = offset[np.newaxis, :] - offset[:, np.newaxis] * factors
+        for arr in (conv, offset, factors, offsetmat):
+            arr.flags.writeable = False
+
+        self._set('units', units)
+        self._set('ids', MappingProxyType({u: i for i, u in enumerate(units)}))
+        self._set('conv', conv)
+        self._set('offset', offset)
+        self._set('factors', factors)
+        self._set('offsets', offsetmat)
+        self._set('types', types)
+        #conversion factor of each pair of same-type, purely multiplicative
+            #units, for single-lookup conversions
+        self._set('pairs', MappingProxyType({(a, b): float(factors[i, j])
+                        for i, a in enumerate(units) for j, b in enumerate(units)
+                        if types[i] == types[j] and offsetmat[i, j] == 0}))
+        #(factor, offset) of each pair of same-type units involving an affine unit
+        self._set('affine', MappingProxyType({(a, b): (float(factors[i, j]), float(offsetmat[i, j]))
+                        for i, a in enumerate(units) for j, b in enumerate(units)
+                        if types[i] == types[j] and offsetmat[i, j] != 0}))
+        #standard unit of each unit type in each system
+        self._set('std', MappingProxyType({(row[5], row[3]): row[0]
+                                            for row in table if row[4] == 1}))
+
+    def _set(self, name, value):
+        """ Set attribute during construction (registry is otherwise immutable)
+        """
+        object.__setattr__(self, name, value)
 
-#SPEED
-convdf = convdf.append(pd.Series(name='mps',  data={'conv':1.0,                'info':'m/s',  'sys':'SI',   'std':1, 'type':'speed' }))
-convdf = convdf.append(pd.Series(name='ftps', data={'conv':conversions['ft'],  'info':'ft/s', 'sys':'USCS', 'std':1, 'type':'speed'}))
+    def __setattr__(self, name, value):
+        raise AttributeError('UnitRegistry is immutable')
 
-#DENSITY
-convdf = convdf.append(pd.Series(name='kgpm3',    data={'conv':1.0, 'info':'Density (kg/m^3)',    'sys':'SI',   'std':1, 'type':'density' }))
-convdf = convdf.append(pd.Series(name='slugpft3', data={'conv':conversions['slug']/conversions['ft']**3, 'info':'Density (slug/ft^3)', 'sys':'USCS', 'std':1 , 'type':'density'}))
+    def __repr__(self):
+        """ Return the representation of this object.
+        """
+        return "unit conversion registry ({} units)".format(len(self.units))
+
+    def __contains__(self, unit):
+        return unit in self.ids
 
-#DYNAMIC VISCOSITY
-convdf = convdf.append(pd.Series(name='kgspm',    data={'conv':1.0, 'info':'Dynamic Viscosity (mu) [kg*s/m]',    'sys':'SI',   'std':1, 'type':'dvisc' }))
-convdf = convdf.append(pd.Series(name='slugspft', data={'conv':conversions['slug']/conversions['ft'], 'info':'Dynamic Viscosity (mu) [slug*s/ft]', 'sys':'USCS', 'std':1 , 'type':'dvisc'}))
+    def Check(self, unit):
+        """ Raise error if unit is not in registry
+        """
+        if unit not in self.ids:
+            raise NotImplementedError('"{}" is not currently a unit option'.format(unit))
+
+    def Factor(self, curunit, newunit):
+        """ Get (factor, offset) conversion between two units of the same type
+        (new = old * factor + offset)
+        """
+        self.Check(curunit)
+        self.Check(newunit)
+        i, j = self.ids[curunit], self.ids[newunit]
+        if self.types[i] != self.types[j]:
+            raise ValueError('Cannot convert "{}" ({}) to "{}" ({})'.format(
+                                curunit, self.types[i], newunit, self.types[j]))
+        return float(self.factors[i, j]), float(self.offsets[i, j])
+
+    def Standard(self, unit, system):
+        """ Get standard unit of given system with same type as given unit
+        """
+        return self.std[(self.types[self.ids[unit]], system)]
 
-#dict to simplify conversion syntax
-conversions = dict(convdf['conv'])
+#LAZY CONVERSION TABLES
+    #registry and pandas view are only built when first used, so importing
+    #this module stays cheap for short scripts
+_registry = None
+_convdf = None
+
+def getregistry():
+    """ Get compiled conversion registry, built from `unittable` on first use
+    (also available as module attribute `units.registry`)
+    """
+    global _registry
+    if _registry is None:
+        _registry = UnitRegistry(unittable, unitoffsets)
+    return _registry
+
+def getconvdf():
+    """ Get pandas DataFrame view of conversion table, built on first request
+    (also available as module attribute `units.convdf`)
+    """
+    global _convdf
+    if _convdf is None:
+        _convdf = pd.DataFrame([row[1:] for row in unittable],
+                               index=[row[0] for row in unittable],
+                               columns=unitcols)
+        _convdf['offset'] = [unitoffsets.get(u, 0.0) for u in _convdf.index]
+    return _convdf
+
+def __getattr__(name):
+    """ Build lazy module attributes on first access
+    """
+    if name == 'registry':
+        return getregistry()
+    if name == 'convdf':
+        return getconvdf()
+    if name == 'conversions':
+        #dict to simplify conversion syntax
+        return dict(zip(getregistry().units, getregistry().conv.tolist()))
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+#UNIT EXPRESSIONS
+    #compound/derived units (e.g. 'slug/ft^3', 'lbf*s^2/ft', 'kg m^-2') are
+    #reduced to base dimensions (mass, length, time, temperature) and their
+    #conversion factors are built from the named units above
+
+#base dimension exponents (M, L, T, Theta) of each unit type
+typedims = {
+    'length'      : (0,  1,  0, 0),
+    'mass'        : (1,  0,  0, 0),
+    'time'        : (0,  0,  1, 0),
+    'temperature' : (0,  0,  0, 1),
+    'dtemperature': (0,  0,  0, 1),
+    'force'       : (1,  1, -2, 0),
+    'pressure'    : (1, -1, -2, 0),
+    'area'        : (0,  2,  0, 0),
+    'speed'       : (0,  1, -1, 0),
+    'density'     : (1, -3,  0, 0),
+    'dvisc'       : (1, -1, -1, 0),
+}
+#unit type of each set of dimensions (temperature dimension in expressions
+    #maps to absolute temperature standard units, which are not affine)
+dimstypes = {d: t for t, d in typedims.items() if t != 'dtemperature'}
+
+#units only available within expressions (same in every system)
+exprunits = {
+    's'   : 1.0,
+    'min' : 1/60,
+    'hr'  : 1/3600,
+}
+
+#standard base unit of each dimension in each system
+baseunits = {
+    'SI'   : ('kg',   'm',  's', 'K'),
+    'USCS' : ('slug', 'ft', 's', 'R'),
+}
+
+_exprtoken = re.compile(r'\s*(\*\*|[*/^()]|[A-Za-z_][A-Za-z_0-9]*|[-+]?\d+(?:\.\d*)?)')
+
+@lru_cache(maxsize=None)
+def parseunit(expr):
+    """ Parse unit expression into conversion factor and base dimensions.
+    Accepts named units combined with '*', '/', spaces (multiply),
+    exponents ('^' or '**'), and parentheses.  Results are memoized.
+    Args:
+        expr (:obj:`str`): unit expression (e.g. 'slug/ft^3', 'kg m^-2')
+    Returns:
+        (:obj:`float`): units of `expr` per equivalent SI unit
+        (:obj:`tuple`): base dimension exponents (M, L, T, Theta)
+    """
+    registry = getregistry()
+    if expr in registry:
+        i = registry.ids[expr]
+        return float(registry.conv[i]), typedims[registry.types[i]]
+    if expr in exprunits:
+        return exprunits[expr], typedims['time']
+
+    #TOKENIZE
+    tokens = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        match = _exprtoken.match(expr, pos)
+        if match is None:
+            raise NotImplementedError('"{}" is not currently a unit option'.format(expr))
+        tokens.append(match.group(1))
+        pos = match.end()
+
+    #RECURSIVE DESCENT: expr := term (('*' | '/' | <space>) term)*
+    def term(i):
+        if tokens[i] == '(':
+            conv, dims, i = product(i + 1)
+            if i >= len(tokens) or tokens[i] != ')':
+                raise NotImplementedError('Unbalanced parentheses in unit "{}"'.format(expr))
+            i += 1
+        elif tokens[i] == '1':
+            conv, dims, i = 1.0, (0, 0, 0, 0), i + 1
+        else:
+            if tokens[i] not in registry and tokens[i] not in exprunits:
+                raise NotImplementedError('"{}" is not currently a unit option'.format(tokens[i]))
+            conv, dims = parseunit(tokens[i])
+            i += 1
+        if i < len(tokens) and tokens[i] in ('^', '**'):
+            power = float(tokens[i+1])
+            conv, dims = conv ** power, tuple(d * power for d in dims)
+            i += 2
+        return conv, dims, i
+
+    def product(i):
+        conv, dims, i = term(i)
+        while i < len(tokens) and tokens[i] != ')':
+            sign = 1
+            if tokens[i] in ('*', '/'):
+                sign = -1 if tokens[i] == '/' else 1
+                i += 1
+            conv2, dims2, i = term(i)
+            conv *= conv2 ** sign
+            dims = tuple(d + sign * d2 for d, d2 in zip(dims, dims2))
+        return conv, dims, i
+
+    try:
+        conv, dims, i = product(0)
+    except (IndexError, ValueError):
+        raise NotImplementedError('"{}" is not a valid unit expression'.format(expr))
+    if i != len(tokens):
+        raise NotImplementedError('"{}" is not a valid unit expression'.format(expr))
+    return conv, tuple(int(d) if float(d).is_integer() else d for d in dims)
+
+@lru_cache(maxsize=None)
+def exprfactor(curunit, newunit):
+    """ Get conversion factor between two unit expressions (memoized)
+    """
+    conv1, dims1 = parseunit(curunit)
+    conv2, dims2 = parseunit(newunit)
+    if dims1 != dims2:
+        raise ValueError('Cannot convert "{}" to "{}", incompatible dimensions'.format(
+                                                                curunit, newunit))
+    return conv2 / conv1
+
+@lru_cache(maxsize=None)
+def conversion(curunit, newunit):
+    """ Get (factor, offset) conversion between two units or unit expressions,
+    new = old * factor + offset (memoized).
+    Named units of different types (e.g. absolute temperature and temperature
+    difference) are not convertible.
+    """
+    registry = getregistry()
+    if curunit in registry and newunit in registry:
+        return registry.Factor(curunit, newunit)
+    for unit in (curunit, newunit):
+        if unit in registry and registry.offset[registry.ids[unit]] != 0:
+            raise ValueError('Affine unit "{}" can only be converted to named units of its type'.format(unit))
+    return exprfactor(curunit, newunit), 0.0
+
+@lru_cache(maxsize=None)
+def standardunit(unit, system):
+    """ Get standard unit of a system with the same dimensions as a unit or
+    unit expression.  Derived dimensions without a named unit type are
+    composed from the system's base units (e.g. 'slug*ft^-1*s^-2')
+    """
+    registry = getregistry()
+    if unit in registry:
+        return registry.Standard(unit, system)
+    conv, dims = parseunit(unit)
+    if dims in dimstypes and (dimstypes[dims], system) in registry.std:
+        return registry.std[(dimstypes[dims], system)]
+    parts = []
+    for base, d in zip(baseunits[system], dims):
+        if d == 1:
+            parts.append(base)
+        elif d != 0:
+            parts.append('{}^{}'.format(base, d))
+    return '*'.join(parts)
 
 # print(convdf)
 # print(conversions)
@@ -305,46 +810,64 @@ def convert(curunit, newunit, value = 1.0):
         #skip, no units
         return value
 
-    if curunit not in conversions:
-        raise NotImplementedError('"{}" is not currently a unit option'.format(curunit))
-    if newunit not in conversions:
-        raise NotImplementedError('"{}" is not currently a unit option'.format(newunit))
-
-    #conversion by dimensional analysis:
+    #conversion by dimensional analysis (precompiled in `registry`):
         #e.g. in2m: 1in * ft2m/ft2in = (0.3048m/1ft)/(12.0in/1ft) = 0.254m/in
     # value *= conversions[newunit] / conversion[curunit]
-    value = value * conversions[newunit] / conversions[curunit]
+    registry = _registry if _registry is not None else getregistry()
+    factor = registry.pairs.get((curunit, newunit))
+    if factor is None:
+        #affine units and unit expressions (memoized)
+        factor, offset = conversion(curunit, newunit)
+        if offset != 0:
+            return value * factor + offset
+    value = value * factor
 
     return value
 
-def batchconvert(df, units, convto=None, verbose=False):
+def unitsystem(convto=None):
+    """ Get name of standard system of units from its aliases
+    Args:
+        convto (:obj:`str`): 'SI'/'metric' or 'USCS'/'imperial' (any case) [None, 'SI']
+    Returns:
+        (:obj:`str`): 'SI' or 'USCS'
+    """
+    if convto is None or convto.lower() == 'metric' or convto.lower() == 'si':
+        #convert to metric
+        return 'SI'
+    elif convto.lower() == 'imperial' or convto.lower() == 'uscs':
+        #convert to US units
+        return 'USCS'
+    raise ValueError('"{}" is not a recognized standard unit system'.format(convto))
+
+def batchconvert(df, units, convto=None, verbose=False, returnbytes=False):
     """ Convert a data set from metric to USCS or vice versa.
+    Columns are grouped by conversion factor (and offset, for affine units
+    like degC) and each group is scaled with one broadcast multiply, in place on the underlying data block when
+    pandas allows it (homogeneous float DataFrame, scaled in one pass if
+    row-major), otherwise by assigning the scaled group back to the dataset.
     Args:
-        df :dataset
+        df :dataset (modified in place)
         units: dict of units corresponding to each key
         convto: str standard system of units to convert to ['SI']
+        returnbytes: also return number of data bytes touched [False]
     Returns:
         converted dataframe
         updated units dict
+        (number of bytes touched, if `returnbytes`)
     """
 
-    if convto is None or convto.lower() == 'metric' or convto.lower() == 'si':
-        #convert to metric
-        convto   = 'SI'
-        convfrom = 'USCS'
-    elif convto.lower() == 'imperial' or convto.lower() == 'uscs':
-        #convert to US units
-        convto   = 'USCS'
-        convfrom = 'SI'
-    else:
-        raise ValueError('"{}" is not a recognized standard unit system'.format(convto))
+    convto = unitsystem(convto)
 
     if verbose:
         print('Mass converting to {} units'.format(convto))
 
-    keys = list(df.index) if type(df) == type(pd.Series()) else list(df.columns)
+    isseries = isinstance(df, pd.Series)
+    keys = list(df.index) if isseries else list(df.columns)
 
-    for key in keys:
+    #GROUP COLUMNS BY CONVERSION FACTOR
+    registry = getregistry()
+    groups = {}
+    for pos, key in enumerate(keys):
 
         #skip parameters that dont have units tracked
         if key not in units: continue
@@ -355,30 +878,492 @@ def batchconvert(df, units, convto=None, verbose=False):
         #skip unitless parameters
         if cur == '-': continue
 
-        #type of units (e.g. 'length')
-        typ = convdf.loc[cur,'type']
-
         #Get standard unit in convert to system for appropriate unit type
             #assumes one standard value per unit type and system (check this with `checkout`)
-        new = convdf[(convdf['std']==1) & (convdf['sys']==convto) & (convdf['type']==typ)]
-        new = new.index.values[0]
+        new = standardunit(cur, convto)
 
-        #convert data
-        df[key] = convert(cur, new, df[key])
         #record new units
         units[key] = new
+        factor = registry.pairs.get((cur, new))
+        offset = 0.0
+        if factor is None:
+            #affine units and unit expressions
+            factor, offset = conversion(cur, new)
+        #already in new units, nothing to convert
+        if cur == new: continue
+        groups.setdefault((factor, offset), []).append(pos)
+
+    #CONVERT EACH GROUP WITH ONE BROADCAST MULTIPLY (AND ADD, IF AFFINE)
+    block = None
+    if not isseries and len(groups) > 0 and len(set(df.dtypes)) == 1 \
+            and np.issubdtype(df.dtypes.iloc[0], np.floating):
+        #writable view of single homogeneous float block (not available with copy-on-write)
+        block = df.to_numpy(copy=False)
+        if not block.flags.writeable or not np.shares_memory(block, df.iloc[:, 0].to_numpy()):
+            block = None
+
+    nbytes = 0
+    ncols = sum(len(p) for p in groups.values())
+    ngroups = len(groups)
+    if block is not None and block.flags.c_contiguous and block.shape[1] > 1:
+        #row-major block: a single pass with a row of factors is fastest
+            #(unconverted columns are scaled exactly by 1.0)
+        factors = np.ones(block.shape[1], dtype=block.dtype)
+        offsets = np.zeros(block.shape[1], dtype=block.dtype)
+        for (factor, offset), pos in groups.items():
+            factors[pos] = factor
+            offsets[pos] = offset
+        block *= factors
+        if offsets.any():
+            block += offsets
+        nbytes = block.nbytes
+        groups = {}
+
+    for (factor, offset), pos in groups.items():
+        if block is not None:
+            if pos[-1] - pos[0] == len(pos) - 1:
+                #contiguous columns, scale view directly
+                views = [block[:, pos[0]:pos[-1]+1]]
+            elif block.flags.f_contiguous:
+                #column-major block, scale each column view in place
+                views = [block[:, p] for p in pos]
+            else:
+                views = None
+                block[:, pos] = block[:, pos] * factor + offset
+            for view in views or []:
+                view *= factor
+                if offset != 0:
+                    view += offset
+            nbytes += len(pos) * block.shape[0] * block.itemsize
+        else:
+            #scale own copy of group in place, assign back to dataset
+            if isseries:
+                vals = df.iloc[pos].to_numpy(copy=True)
+            else:
+                cols = [keys[p] for p in pos]
+                vals = df[cols].to_numpy(copy=True)
+            if not np.issubdtype(vals.dtype, np.inexact):
+                vals = vals.astype(np.float64)
+            vals *= factor
+            if offset != 0:
+                vals += offset
+            if isseries:
+                df.iloc[pos] = vals
+            else:
+                df[cols] = vals
+            nbytes += vals.nbytes
+
+    if verbose:
+        print('    {} columns in {} conversion groups, {} bytes touched'.format(
+                ncols, ngroups, nbytes))
 
+    if returnbytes:
+        return df, units, nbytes
     return df, units
 
 
 
+#STREAMING FILE CONVERSION
+
+_unitheader = re.compile(r'^(.*?)\[(.*)\]$')
+
+def _splitline(line, sep):
+    """ Split text line by column delimiter (regex or literal)
+    """
+    line = line.rstrip('\r\n')
+    if sep in (r'\s+', None, ' '):
+        return line.split()
+    return [x.strip() for x in re.split(sep, line)]
+
+def convertfile(infile, outfile, units=None, convto='SI', unitrow=False,
+                sep=r'\s+', outsep=None, chunksize=100000, comment='#',
+                floatfmt=None, verbose=False):
+    """ Convert a delimited text data file to a standard unit system, in
+    chunks of rows (bounded memory).  Conversion factors are computed once
+    per column and applied to each chunk, which is written as it goes.
+
+    Column units come from (in order of precedence):
+        `units` mapping or header file (see `readheader`),
+        a second header line of units (`unitrow`), or
+        column names with bracketed units, e.g. 'V[ftps]'.
+    Columns without units are copied unchanged. The output header is
+    written in the same style as the input, with the new units.
+
+    Args:
+        infile  (:obj:`str`): path to input file (header row of column names)
+        outfile (:obj:`str`): path to output file
+        units (:obj:`dict` or :obj:`str`): column units mapping or header file path [None]
+        convto (:obj:`str`): standard system of units to convert to ['SI']
+        unitrow (:obj:`bool`): second header line holds column units [False]
+        sep (:obj:`str`): input column delimiter [whitespace]
+        outsep (:obj:`str`): output column delimiter [same as input, space for whitespace]
+        chunksize (:obj:`int`): number of rows per chunk [100000]
+        comment (:obj:`str`): comment character of input [#]
+        floatfmt (:obj:`str`): output float format, e.g. '%.8e' [pandas default]
+        verbose (:obj:`bool`): print conversions [False]
+    Returns:
+        (:obj:`dict`): new column units
+    """
+    convto = unitsystem(convto)
+    if outsep is None:
+        outsep = ' ' if sep in (r'\s+', None, ' ') else sep
+    if isinstance(units, (str, os.PathLike)):
+        units = {k : v[0] for k, v in readheader(units).items()}
+
+    tmpfile = outfile + '.part'
+    with open(infile) as fin:
+
+        #READ HEADER
+        line = fin.readline()
+        while line.lstrip().startswith(comment):
+            line = fin.readline()
+        names = _splitline(line, sep)
+        curunits = {}
+        bracketed = False
+        if unitrow:
+            curunits = dict(zip(names, _splitline(fin.readline(), sep)))
+        elif units is None:
+            for i, name in enumerate(names):
+                match = _unitheader.match(name)
+                if match is not None:
+                    names[i] = match.group(1)
+                    curunits[names[i]] = match.group(2)
+                    bracketed = True
+        if units is not None:
+            curunits.update(units)
+
+        #PRECOMPUTE CONVERSION OF EACH COLUMN, GROUPED BY FACTOR
+        newunits = dict(curunits)
+        groups = {}
+        for name in names:
+            cur = curunits.get(name, '-')
+            if cur == '-':
+                continue
+            new = standardunit(cur, convto)
+            newunits[name] = new
+            if new == cur:
+                continue
+            groups.setdefault(conversion(cur, new), []).append(name)
+            if verbose:
+                print('    {}: {} --> {}'.format(name, cur, new))
+
+        #STREAM CHUNKS
+        nrow = 0
+        with open(tmpfile, 'w') as fout:
+            if bracketed:
+                fout.write(outsep.join('{}[{}]'.format(n, newunits[n]) if n in curunits
+                                        else n for n in names) + '\n')
+            else:
+                fout.write(outsep.join(names) + '\n')
+            if unitrow:
+                fout.write(outsep.join(newunits.get(n, '-') for n in names) + '\n')
+
+            reader = pd.read_csv(fin, sep=sep, names=names, header=None,
+                                    comment=comment, chunksize=chunksize)
+            for chunk in reader:
+                for (factor, offset), cols in groups.items():
+                    vals = chunk[cols].to_numpy(dtype=float) * factor
+                    if offset != 0:
+                        vals += offset
+                    chunk[cols] = vals
+                chunk.to_csv(fout, sep=outsep, index=False, header=False,
+                                float_format=floatfmt)
+                nrow += len(chunk)
+    os.replace(tmpfile, outfile)
+
+    if verbose:
+        print('Converted {} rows of "{}" to {} units'.format(nrow, infile, convto))
+    return {n : newunits.get(n, '-') for n in names}
+
+#UNIT-AWARE ARRAYS
+    #`Quantity` carries a unit (any unit or unit expression) through numpy
+    #arithmetic, e.g. through `aero.q`, `aero.Re`, `aero.SpeedOfSound`.
+    #Unit rules of each (ufunc, units) combination are cached, so the
+    #per-operation overhead is a dictionary lookup, independent of array size
+
+_nodims = (0, 0, 0, 0)
+_simpleunit = re.compile(r'^[A-Za-z_][A-Za-z_0-9]*$')
+
+#ufuncs whose inputs must share dimensions (others are converted to first unit)
+_sameunitufuncs = {'add', 'subtract', 'hypot', 'maximum', 'minimum', 'fmax',
+                   'fmin', 'remainder', 'fmod'}
+#ufuncs comparing inputs with same dimensions, returning plain arrays
+_compareufuncs = {'less', 'less_equal', 'greater', 'greater_equal', 'equal',
+                  'not_equal', 'arctan2'}
+#ufuncs that keep unit of their single input
+_keepunitufuncs = {'negative', 'positive', 'absolute', 'fabs', 'rint', 'floor',
+                   'ceil', 'trunc', 'conjugate'}
+#ufuncs returning plain arrays regardless of units
+_plainufuncs = {'isnan', 'isinf', 'isfinite', 'sign', 'signbit'}
+#array functions (non-ufuncs) joining/selecting arrays, converted to unit of first input
+_sameunitfunctions = {'concatenate', 'stack', 'hstack', 'vstack', 'dstack',
+                      'column_stack', 'where'}
+
+@lru_cache(maxsize=None)
+def unitinfo(unit):
+    """ Get (conv, dims) of unit or unit expression, '-' for no units (memoized)
+    """
+    if unit == '-':
+        return 1.0, _nodims
+    return parseunit(unit)
+
+def _wrapunit(unit):
+    """ Parenthesize unit expression for composition
+    """
+    return unit if _simpleunit.match(unit) else '({})'.format(unit)
+
+def _powunit(unit, power):
+    """ Unit expression of unit raised to power
+    """
+    if unit == '-' or power == 1:
+        return unit
+    power = int(power) if float(power).is_integer() else power
+    return '{}^{}'.format(_wrapunit(unit), power)
+
+def _tidyunit(unit):
+    """ Collapse dimensionless unity-factor expressions (e.g. 'mps/mps') to '-'
+    """
+    conv, dims = unitinfo(unit)
+    if dims == _nodims and abs(conv - 1) < 1e-14:
+        return '-'
+    return unit
+
+#temperature difference unit of each absolute temperature unit
+_difftemps = {'K' : 'dK', 'R' : 'dR', 'degC' : 'dC', 'degF' : 'dF'}
+
+def _istype(unit, typ):
+    """ Check if unit is a named unit of given type
+    """
+    registry = getregistry()
+    return unit in registry and registry.types[registry.ids[unit]] == typ
+
+def _isaffine(unit):
+    """ Check if unit is a named unit with an offset (e.g. degC)
+    """
+    registry = getregistry()
+    return unit in registry and registry.offset[registry.ids[unit]] != 0
+
+@lru_cache(maxsize=None)
+def _ufuncrule(name, units, power=None):
+    """ Get unit rule for a ufunc call: scale factor and offset applied to
+    each input (input*factor + offset) and result unit (None for plain array
+    output).  Memoized per (ufunc, input units, power), which forms the
+    cached dimension table.
+    Absolute temperatures are fully converted (with offset, for degC/degF)
+    for comparisons, maximum/minimum and joins (`_sameunitfunctions`,
+    e.g. concatenate); their difference is a temperature
+    difference (degC - degC --> dC, K - K --> dK) and temperature
+    differences may be added to/subtracted from them.  Other operations on
+    affine temperatures raise.
+    """
+    dims = [unitinfo(u)[1] for u in units]
+    ones = (1.0,) * len(units)
+    zeros = (0.0,) * len(units)
+
+    if name in _sameunitufuncs or name in _compareufuncs or name in _sameunitfunctions:
+        #convert all inputs to unit of first input with units
+        ref = next((u for u in units if u != '-'), '-')
+        if any(d != dims[units.index(ref)] for d in dims):
+            raise ValueError('Cannot {} quantities with units {}'.format(name, units))
+        temps = [u for u in units if _istype(u, 'temperature')]
+        if not temps:
+            factors = tuple(1.0 if u == ref else conversion(u, ref)[0] for u in units)
+            return factors, zeros, (None if name in _compareufuncs else ref)
+
+        if name in _compareufuncs or name in _sameunitfunctions \
+                or name in ('maximum', 'minimum', 'fmax', 'fmin'):
+            #full (factor, offset) conversion of absolute temperatures
+            convs = [(1.0, 0.0) if u == ref else conversion(u, ref) for u in units]
+            return (tuple(c[0] for c in convs), tuple(c[1] for c in convs),
+                    None if name in _compareufuncs else ref)
+        if name == 'subtract' and all(_istype(u, 'temperature') for u in units):
+            #difference of absolute temperatures
+            convs = [(1.0, 0.0) if u == ref else conversion(u, ref) for u in units]
+            return (tuple(c[0] for c in convs), tuple(c[1] for c in convs),
+                    _difftemps[ref])
+        if name in ('add', 'subtract') and len(temps) == 1 \
+                and (name == 'add' or units[0] == temps[0]) \
+                and all(u in temps or _istype(u, 'dtemperature') for u in units):
+            #absolute temperature plus/minus temperature difference
+            ref = temps[0]
+            factors = tuple(1.0 if u == ref else conversion(u, _difftemps[ref])[0]
+                                for u in units)
+            return factors, zeros, ref
+        if not any(_isaffine(u) for u in units) and len(temps) == len(units):
+            #absolute temperatures on absolute scales (K, R) are linear
+            factors = tuple(1.0 if u == ref else conversion(u, ref)[0] for u in units)
+            return factors, zeros, ref
+        raise ValueError('Cannot {} quantities with affine units {}'.format(name, units))
+
+    if name == 'multiply':
+        parts = [_wrapunit(u) for u in units if u != '-']
+        return ones, zeros, _tidyunit('*'.join(parts)) if parts else '-'
+    if name in ('divide', 'true_divide', 'floor_divide'):
+        num, den = units
+        if den == '-':
+            return ones, zeros, num
+        unit = '{}/{}'.format(_wrapunit(num) if num != '-' else '1', _wrapunit(den))
+        return ones, zeros, _tidyunit(unit)
+    if name == 'power':
+        if power is None:
+            if dims[0] != _nodims:
+                raise ValueError('Exponent of quantity with units must be a scalar')
+            return ones, zeros, units[0]
+        if dims[1] != _nodims:
+            raise ValueError('Exponent cannot have units')
+        return ones, zeros, _powunit(units[0], power)
+    if name == 'sqrt':
+        return ones, zeros, _powunit(units[0], 0.5)
+    if name == 'cbrt':
+        return ones, zeros, _powunit(units[0], 1/3)
+    if name == 'square':
+        return ones, zeros, _powunit(units[0], 2)
+    if name == 'reciprocal':
+        return ones, zeros, _powunit(units[0], -1)
+    if name in _keepunitufuncs:
+        return ones, zeros, units[0]
+    if name in _plainufuncs:
+        return ones, zeros, None
+
+    #everything else (exp, log, trig, ...) requires dimensionless inputs
+    if any(d != _nodims for d in dims):
+        raise ValueError('{} requires dimensionless input, got units {}'.format(name, units))
+    #scale dimensionless ratios (e.g. 'ft/m') to pure numbers
+    return tuple(1 / unitinfo(u)[0] for u in units), zeros, '-'
+
+class Quantity(np.ndarray):
+    """ Lightweight unit-aware numpy array.
+    Carries a unit (named unit or unit expression, '-' for none) through
+    numpy arithmetic and ufuncs, checking dimensional compatibility with a
+    cached rule table.  Plain numbers/arrays are treated as dimensionless.
+    Joins and selections (np.concatenate, np.stack, np.where, ...) convert
+    their inputs to the unit of the first one, or raise for incompatible units.
+
+    HOW TO USE:
+        rho = units.Quantity(rho, 'slugpft3')
+        V   = units.Quantity(V, 'ftps')
+        qinf = aero.q(rho, V)       # carries unit 'slugpft3*ftps^2'
+        qinf.to('Pa')
+    """
+
+    def __new__(cls, value, unit='-'):
+        """ Create quantity from array-like value and its unit
+        """
+        obj = np.asarray(value).view(cls)
+        obj.unit = unit
+        unitinfo(unit) #validate
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.unit = getattr(obj, 'unit', '-')
+
+    def __repr__(self):
+        return 'Quantity({}, unit={!r})'.format(np.asarray(self), self.unit)
+
+    def __reduce__(self):
+        #include unit when pickling
+        constructor, args, state = super().__reduce__()
+        return constructor, args, (state, self.unit)
+
+    def __setstate__(self, state):
+        state, self.unit = state
+        super().__setstate__(state)
+
+    @property
+    def value(self):
+        """ Plain numpy array view of data (no units)
+        """
+        return self.view(np.ndarray)
+
+    def to(self, unit):
+        """ Convert to new (compatible) unit
+        Args:
+            unit (:obj:`str`): unit or unit expression to convert to
+        """
+        return Quantity(convert(self.unit, unit, self.view(np.ndarray)) \
+                        if self.unit != '-' else self.view(np.ndarray).copy(), unit)
+
+    def __getitem__(self, key):
+        result = super().__getitem__(key)
+        if isinstance(result, np.ndarray):
+            return result
+        #scalar element, keep unit as 0-d quantity
+        result = np.asarray(result).view(Quantity)
+        result.unit = self.unit
+        return result
+
+    def __array_function__(self, func, types, args, kwargs):
+        name = func.__name__
+        if name not in _sameunitfunctions or (name == 'where' and len(args) != 3):
+            #other functions work on the data as ndarray subclasses
+            return super().__array_function__(func, types, args, kwargs)
+
+        #convert joined/selected arrays to one unit (or raise)
+        if name == 'where':
+            cond, arrays = args[0], list(args[1:])
+        else:
+            arrays = list(args[0])
+        units = tuple(getattr(x, 'unit', '-') for x in arrays)
+        factors, offsets, unit = _ufuncrule(name, units)
+        arrays = [x.view(np.ndarray) if isinstance(x, Quantity) else x for x in arrays]
+        arrays = [a if f == 1.0 and o == 0.0 else np.add(np.multiply(a, f), o)
+                    for a, f, o in zip(arrays, factors, offsets)]
+        out = kwargs.get('out')
+        if isinstance(out, Quantity):
+            kwargs = dict(kwargs, out=out.view(np.ndarray))
+
+        if name == 'where':
+            result = func(np.asarray(cond), *arrays)
+        else:
+            result = func(arrays, *args[1:], **kwargs)
+        if out is not None:
+            if isinstance(out, Quantity):
+                out.unit = unit
+            return out
+        result = np.asarray(result).view(Quantity)
+        result.unit = unit
+        return result
+
+    def __array_ufunc__(self, ufunc, method, *inputs, out=None, **kwargs):
+        units = tuple(getattr(x, 'unit', '-') for x in inputs)
+        args = [x.view(np.ndarray) if isinstance(x, Quantity) else x for x in inputs]
+        if out is not None:
+            kwargs['out'] = tuple(o.view(np.ndarray) if isinstance(o, Quantity) else o
+                                    for o in out)
+
+        if method == '__call__':
+            power = None
+            if ufunc.__name__ == 'power' and np.ndim(args[1]) == 0:
+                power = float(args[1])
+            factors, offsets, unit = _ufuncrule(ufunc.__name__, units, power)
+            args = [a if f == 1.0 else np.multiply(a, f) for a, f in zip(args, factors)]
+            args = [a if o == 0.0 else np.add(a, o) for a, o in zip(args, offsets)]
+        elif method in ('reduce', 'accumulate', 'reduceat') \
+                and ufunc.__name__ in ('add', 'maximum', 'minimum', 'fmax', 'fmin'):
+            unit = units[0]
+        else:
+            #other methods drop units
+            unit = None
+
+        result = getattr(ufunc, method)(*args, **kwargs)
+        if out is not None:
+            result = out[0] if len(out) == 1 else out
+            if isinstance(result, Quantity):
+                result.unit = unit if unit is not None else '-'
+            return result
+        if unit is None or isinstance(result, tuple):
+            return result
+        result = np.asarray(result).view(Quantity)
+        result.unit = unit
+        return result
+
 def gethelp():
     """ Provide usage help. Print out all available units for conversion.
     """
     print('EVENTUALLY ADD THIS AS A -h OPTION')
 
     print('\nAvailable units to convert:\n')
-    print(convdf['info'])
+    print(getconvdf()['info'])
     # for unit, row in conversions.iteritems():
     #     print('    {} ({})'.format(unit, row.info))
 
@@ -465,6 +1450,7 @@ def checkout(tol=1e-16):
 
     #UNIQUE STANDARD SYSTEMS CHECK
     #Get standard unit in convert to system for appropriate unit type
+    convdf = getconvdf()
     tmp = convdf[convdf['std']==1]
 
     #loop through systems
@@ -497,8 +1483,287 @@ def checkout(tol=1e-16):
 
 
 
+def verify(nchains=2000, maxlen=8, nrepeat=1000, seed=0, ulps=4, verbose=False):
+    """ Randomized verification of the conversion engine (complements the
+    hand-written `checkout` cases).  For every unit type:
+        inverse consistency: factor(a,b)*factor(b,a) == 1 and affine round
+            trips return the start value
+        transitivity: factor(a,b)*factor(b,c) == factor(a,c)
+        random round-trip chains a->b->...->a return the start value
+        repeated round trips (e.g. kgpm3<->slugpft3) drift at most linearly
+    Tolerances are `ulps` machine epsilons per conversion step (relative to
+    the value, plus the largest offset of affine units involved).
+    Unit expressions are also checked against equivalent named units.
+    Args:
+        nchains (:obj:`int`): number of random round-trip chains [2000]
+        maxlen (:obj:`int`): maximum number of conversions per chain [8]
+        nrepeat (:obj:`int`): number of repeated round trips for drift [1000]
+        seed (:obj:`int`): random seed [0]
+        ulps (:obj:`float`): tolerance in machine epsilons per step [4]
+        verbose (:obj:`bool`): print every check [False]
+    Returns:
+        (:obj:`~pandas.DataFrame`): worst error of each check and unit type
+    """
+    eps = np.finfo(float).eps
+    rng = np.random.default_rng(seed)
+    registry = getregistry()
+    bytype = {}
+    for u, typ in zip(registry.units, registry.types):
+        bytype.setdefault(typ, []).append(u)
+
+    def scale(x, *units):
+        #magnitude errors are measured against (plus largest offset of affine units)
+        return np.abs(x) + max(abs(registry.offset[registry.ids[u]]) for u in units)
+
+    rows = []
+    def record(check, typ, err, steps, example):
+        rows.append({'check' : check, 'type' : typ, 'err' : err / eps,
+                        'tol' : ulps * steps, 'ok' : err <= ulps * steps * eps,
+                        'example' : example})
+
+    for typ, names in bytype.items():
+        pairs = [(a, b) for a in names for b in names]
+
+        #INVERSE CONSISTENCY
+        worst, ex = 0.0, None
+        for a, b in pairs:
+            x = 10 ** rng.uniform(-6, 6, 16) * rng.choice([-1, 1], 16)
+            if registry.offset[registry.ids[a]] or registry.offset[registry.ids[b]]:
+                x = rng.uniform(0, 1000, 16)
+                x = convert('K', a, x) if typ == 'temperature' else x
+            back = convert(b, a, convert(a, b, x))
+            err = np.max(np.abs(back - x) / scale(x, a, b))
+            f1, f2 = conversion(a, b)[0], conversion(b, a)[0]
+            err = max(err, abs(f1 * f2 - 1))
+            if err >= worst:
+                worst, ex = err, '{}<->{}'.format(a, b)
+        record('inverse', typ, worst, 2, ex)
+
+        #TRANSITIVITY OF FACTORS
+        worst, ex = 0.0, None
+        for a, b in pairs:
+            for c in names:
+                err = abs(conversion(a, b)[0] * conversion(b, c)[0] / conversion(a, c)[0] - 1)
+                if err >= worst:
+                    worst, ex = err, '{}->{}->{}'.format(a, b, c)
+        record('transitive', typ, worst, 3, ex)
+
+        #RANDOM ROUND-TRIP CHAINS
+        worst, ex, steps = 0.0, None, 1
+        for i in range(max(1, nchains // len(bytype))):
+            chain = list(rng.choice(names, rng.integers(1, maxlen)))
+            chain = chain + chain[:1]
+            x = 10 ** rng.uniform(-6, 6) * rng.choice([-1, 1])
+            if typ == 'temperature':
+                x = convert('K', chain[0], rng.uniform(0, 1000))
+            y = x
+            for a, b in zip(chain[:-1], chain[1:]):
+                y = convert(a, b, y)
+            err = abs(y - x) / scale(x, *chain)
+            if err / (len(chain) - 1) >= worst / steps:
+                worst, ex, steps = err, '->'.join(chain), len(chain) - 1
+        record('chain', typ, worst, steps, ex)
+
+        #DRIFT OF REPEATED ROUND TRIPS
+        worst, ex = 0.0, None
+        for a, b in pairs:
+            x0 = x = 1.4857848 if typ != 'temperature' else convert('K', a, 288.15)
+            for i in range(nrepeat):
+                x = convert(b, a, convert(a, b, x))
+            err = abs(x - x0) / scale(x0, a, b)
+            if err >= worst:
+                worst, ex = err, '{}<->{} x{}'.format(a, b, nrepeat)
+        record('drift', typ, worst, 2 * nrepeat, ex)
+
+    #UNIT EXPRESSIONS VS NAMED UNITS
+        #(tolerance is loose where named units use rounded constants, e.g.
+        #lbf vs slug*ft/s^2, see density note in `checkout`)
+    for expr, named, tol in [('ft/s', 'ftps', 2), ('m/s', 'mps', 2),
+                             ('ft^2', 'ft2', 2), ('ft*ft', 'ft2', 2),
+                             ('kg/m^3', 'kgpm3', 2), ('slug/ft^3', 'slugpft3', 4),
+                             ('slug/(ft*s)', 'slugspft', 4), ('N/m^2', 'Pa', 2),
+                             ('lbf/ft^2', 'psf', 1e9), ('slug*ft/s^2', 'lbf', 1e9)]:
+        err = abs(conversion(expr, named)[0] - 1)
+        rows.append({'check' : 'expression', 'type' : named, 'err' : err / eps,
+                        'tol' : tol, 'ok' : err <= tol * eps,
+                        'example' : '{} == {}'.format(expr, named)})
+
+    results = pd.DataFrame(rows)
+    print('\nRandomized unit conversion verification')
+    bad = results[~results['ok']]
+    if verbose:
+        print(results.to_string())
+    if not bad.empty:
+        print('    CONVERSION ERRORS EXCEEDED TOLERANCE HERE (errors in machine epsilons):')
+        print(bad.to_string())
+    else:
+        print('    CHECKS OUT! ({} checks, worst error {:.0%} of tolerance)'.format(
+                                len(results), (results['err'] / results['tol']).max()))
+    return results
+
+def benchmarkthroughput(nscalar=100000, narray=10**6, nrows=10**5, ncols=50, repeat=3):
+    """ Measure conversion throughput of the conversion engine for scalars,
+    arrays, unit expressions and DataFrames (million values per second), to
+    catch performance regressions
+    nscalar --> number of scalar conversions
+    narray  --> number of array elements
+    nrows   --> number of rows of benchmark DataFrame
+    ncols   --> number of columns of benchmark DataFrame
+    repeat  --> number of timing repetitions (best is reported)
+    """
+    rng = np.random.default_rng(0)
+    arr = rng.random(narray)
+    choices = ['ft', 'in', 'slug', 'lbf', 'psf', 'R', 'degF', 'ftps', 'slugpft3', '-']
+    units = {'c{}'.format(i): choices[i % len(choices)] for i in range(ncols)}
+    df = pd.DataFrame(rng.random((nrows, ncols)), columns=list(units.keys()))
+
+    def scalars():
+        for i in range(nscalar):
+            convert('ft', 'm', 2.0)
+    def affine():
+        for i in range(nscalar):
+            convert('degF', 'K', 2.0)
+    def expressions():
+        for i in range(nscalar):
+            convert('slug/(ft*s)', 'kg/(m*s)', 2.0)
+
+    cases = [
+        ('scalar',            scalars,                                    nscalar),
+        ('scalar affine',     affine,                                     nscalar),
+        ('scalar expression', expressions,                                nscalar),
+        ('array',             lambda: convert('ft', 'm', arr),            narray),
+        ('DataFrame batch',   lambda: batchconvert(df.copy(), dict(units), 'SI'), nrows * ncols),
+    ]
+
+    print('\nUnit conversion throughput')
+    for name, func, nvals in cases:
+        best = np.inf
+        for i in range(repeat):
+            t0 = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - t0)
+        print('    {:<18} {:10d} values {:9.4f}s {:10.3f} Mvalues/s'.format(
+                                name, nvals, best, nvals / best / 1e6))
+
+def benchmark(ncols=2000, nrows=100, nscalar=100000):
+    """ Benchmark compiled registry conversions against the original
+    per-call dictionary/DataFrame-mask lookups
+    ncols   --> number of columns of benchmark DataFrame
+    nrows   --> number of rows of benchmark DataFrame
+    nscalar --> number of scalar conversions
+    """
 
-def main():
+    convdf = getconvdf()
+    conversions = dict(convdf['conv'])
+
+    def legacyconvert(curunit, newunit, value=1.0):
+        #original `convert` path
+        if curunit not in conversions:
+            raise NotImplementedError(curunit)
+        if newunit not in conversions:
+            raise NotImplementedError(newunit)
+        return value * conversions[newunit] / conversions[curunit]
+
+    def legacybatch(df, units, convto):
+        #original `batchconvert` path (boolean mask over `convdf` per column)
+        for key in df.columns:
+            cur = units[key]
+            typ = convdf.loc[cur,'type']
+            new = convdf[(convdf['std']==1) & (convdf['sys']==convto) & (convdf['type']==typ)]
+            new = new.index.values[0]
+            df[key] = legacyconvert(cur, new, df[key])
+            units[key] = new
+        return df, units
+
+    print('\nUnit conversion benchmark')
+
+    #SCALAR CONVERSIONS
+    t0 = time.perf_counter()
+    for i in range(nscalar):
+        legacyconvert('ft', 'm', 2.0)
+    t1 = time.perf_counter()
+    for i in range(nscalar):
+        convert('ft', 'm', 2.0)
+    t2 = time.perf_counter()
+    print('    {} scalar conversions:   original {:8.4f}s, registry {:8.4f}s'.format(
+                                                    nscalar, t1 - t0, t2 - t1))
+
+    #DATAFRAME BATCH CONVERSIONS
+    choices = ['ft', 'in', 'mi', 'slug', 'lbf', 'psf', 'psi', 'R', 'ftps', 'slugpft3']
+    units = {'c{}'.format(i): choices[i % len(choices)] for i in range(ncols)}
+    df = pd.DataFrame(np.random.default_rng(0).random((nrows, ncols)),
+                        columns=list(units.keys()))
+    t0 = time.perf_counter()
+    d1, u1 = legacybatch(df.copy(), units.copy(), 'SI')
+    t1 = time.perf_counter()
+    d2, u2 = batchconvert(df.copy(), units.copy(), convto='SI')
+    t2 = time.perf_counter()
+    print('    {}x{} DataFrame batch:   original {:8.4f}s, registry {:8.4f}s'.format(
+                                                    nrows, ncols, t1 - t0, t2 - t1))
+    if u1 != u2 or not np.allclose(d1.values, d2.values, rtol=1e-15, atol=0):
+        raise ValueError('registry batch conversion does not match original')
+
+def benchmarkimport(n=5):
+    """ Benchmark cost of importing this module in a fresh interpreter
+    (numpy/pandas already imported) and of lazily building conversion tables
+    n --> number of fresh interpreters to time (median is reported)
+    """
+    import subprocess
+    import sys
+
+    code = ('import time, numpy, pandas; t0 = time.perf_counter(); import units; '
+            't1 = time.perf_counter(); units.getregistry(); t2 = time.perf_counter(); '
+            'units.getconvdf(); t3 = time.perf_counter(); print(t1-t0, t2-t1, t3-t2)')
+    times = []
+    for i in range(n):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                    text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append([float(t) for t in out.stdout.split()])
+    times = np.median(times, axis=0) * 1e3
+
+    print('\nUnits import benchmark (median of {} interpreters)'.format(n))
+    print('    import units:          {:8.3f} ms'.format(times[0]))
+    print('    first registry build:  {:8.3f} ms'.format(times[1]))
+    print('    first convdf build:    {:8.3f} ms'.format(times[2]))
+
+def benchmarkquantity(n=10**6, repeat=5):
+    """ Benchmark overhead of unit-aware `Quantity` arithmetic compared with
+    plain numpy arrays (same operations on both sides, no unit conversions).
+    The per-operation unit bookkeeping is constant, but chained expressions
+    remain slower on large arrays because numpy cannot reuse temporaries of
+    array subclasses in place: e.g. the Reynolds number chain is still about
+    2x the plain ndarray time at 10^7 elements.
+    n      --> number of array elements
+    repeat --> number of timing repetitions (best is reported)
+    """
+    rng = np.random.default_rng(0)
+    rho, V, L, mu = rng.random((4, n)) + 1
+    qrho, qV = Quantity(rho, 'kgpm3'), Quantity(V, 'mps')
+    qL, qmu = Quantity(L, 'm'), Quantity(mu, 'kgspm')
+
+    cases = [
+        ('dynamic pressure', lambda: 0.5 * rho * V ** 2, lambda: 0.5 * qrho * qV ** 2),
+        ('Reynolds number',  lambda: rho * V * L / mu,   lambda: qrho * qV * qL / qmu),
+        ('sum of speeds',    lambda: V + V,              lambda: qV + qV),
+    ]
+
+    print('\nQuantity overhead benchmark ({} elements)'.format(n))
+    for name, plain, unit in cases:
+        times = []
+        for func in (plain, unit):
+            best = np.inf
+            for i in range(repeat):
+                t0 = time.perf_counter()
+                func()
+                best = min(best, time.perf_counter() - t0)
+            times.append(best)
+        print('    {:<18} plain {:8.3f} ms, Quantity {:8.3f} ms ({:+.1f}%)'.format(
+                name, times[0] * 1e3, times[1] * 1e3, (times[1] / times[0] - 1) * 100))
+
+def example():
+    """ Print available conversions, run `checkout`, and convert an example
+    UnitTracker dataset
+    """
 
     #Print available conversions
     gethelp()
@@ -535,6 +1800,50 @@ def main():
 
     print(dat)
 
+def main(argv=None):
+    """ Command line interface. Without a command, runs `example`
+    (conversion checkout). Use 'convert' to stream-convert a delimited file:
+        python units.py convert in.dat out.dat --to SI --units header.txt
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description='Unit conversions and tracking')
+    sub = parser.add_subparsers(dest='command')
+
+    sub.add_parser('checkout', help='print available units and check conversions (default)')
+    sub.add_parser('verify', help='run randomized round-trip verification')
+    bench = sub.add_parser('benchmark', help='benchmark conversion engine')
+    bench.add_argument('--ncols', type=int, default=2000)
+    bench.add_argument('--nrows', type=int, default=100)
+
+    conv = sub.add_parser('convert', help='stream-convert a delimited text file to a standard unit system')
+    conv.add_argument('infile')
+    conv.add_argument('outfile')
+    conv.add_argument('--to', dest='convto', default='SI', help="unit system to convert to ['SI']")
+    conv.add_argument('--units', default=None,
+                        help="header file of 'name unit [info]' lines [units read from column headers]")
+    conv.add_argument('--unitrow', action='store_true', help='second header line holds column units')
+    conv.add_argument('--sep', default=r'\s+', help='input column delimiter [whitespace]')
+    conv.add_argument('--outsep', default=None, help='output column delimiter [same as input]')
+    conv.add_argument('--chunksize', type=int, default=100000, help='rows per chunk [100000]')
+    conv.add_argument('--floatfmt', default=None, help="output float format, e.g. '%%.8e'")
+    conv.add_argument('-v', '--verbose', action='store_true')
+
+    args = parser.parse_args(argv)
+    if args.command == 'convert':
+        convertfile(args.infile, args.outfile, units=args.units, convto=args.convto,
+                    unitrow=args.unitrow, sep=args.sep, outsep=args.outsep,
+                    chunksize=args.chunksize, floatfmt=args.floatfmt,
+                    verbose=args.verbose)
+    elif args.command == 'verify':
+        bad = ~verify()['ok']
+        if bad.any():
+            raise SystemExit(1)
+    elif args.command == 'benchmark':
+        benchmark(ncols=args.ncols, nrows=args.nrows)
+        benchmarkthroughput()
+    else:
+        example()
+
 
 
 